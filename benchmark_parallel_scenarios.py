@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark for process-pool scenario evaluation.
+
+Evaluates a synthetic scenario set serially and with --workers processes
+through run_evaluation.evaluate_scenarios, checks that both runs produce
+identical aggregates and reports the speedup.
+
+Usage:
+    python benchmark_parallel_scenarios.py --scenarios 1000 --workers 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from run_evaluation import evaluate_scenarios, aggregate_results
+from srlp_framework.test_scenarios import get_all_test_scenarios
+
+
+def synthetic_scenarios(count):
+    """Build count (name, problem) pairs by cycling over the bundled scenarios."""
+    templates = get_all_test_scenarios()
+    loaded = []
+    for i in range(count):
+        template = templates[i % len(templates)]
+        problem = dict(template['problem'])
+        problem['goal'] = f"{problem.get('goal', 'No goal specified')} (variant {i})"
+        loaded.append((f"{template['name']}-{i}", problem))
+    return loaded
+
+
+def timed_run(loaded, workers, iterations, **llm_kwargs):
+    """Evaluate loaded quietly, returning (results, seconds)."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = evaluate_scenarios(loaded, "mock", iterations=iterations, workers=workers,
+                                     **llm_kwargs)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare serial and process-pool evaluation')
+    parser.add_argument('--scenarios', type=int, default=1000,
+                        help='Number of synthetic scenarios (default: 1000)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='Worker processes for the parallel run (default: CPU count)')
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='Refinement iterations per scenario (default: 3)')
+    parser.add_argument('--mock-latency', type=float, metavar='SCALE',
+                        help='Also simulate provider latency, scaled by SCALE (e.g. 0.001)')
+    args = parser.parse_args()
+
+    llm_kwargs = {}
+    if args.mock_latency:
+        llm_kwargs = {'latency_profile': True, 'latency_scale': args.mock_latency}
+
+    loaded = synthetic_scenarios(args.scenarios)
+    serial, serial_time = timed_run(loaded, 1, args.iterations, **llm_kwargs)
+    parallel, parallel_time = timed_run(loaded, args.workers, args.iterations, **llm_kwargs)
+
+    serial_aggregate = aggregate_results(serial)
+    parallel_aggregate = aggregate_results(parallel)
+
+    print("=" * 60)
+    print("Parallel scenario evaluation benchmark")
+    print("=" * 60)
+    print(f"Scenarios: {args.scenarios}  Workers: {args.workers}")
+    print(f"Serial:                   {serial_time:8.2f}s")
+    print(f"Process pool:             {parallel_time:8.2f}s")
+    print(f"Speedup:                  {serial_time / parallel_time:8.2f}x")
+    print(f"Aggregates identical:     {'yes' if serial_aggregate == parallel_aggregate else 'NO'}")
+    if serial_aggregate != parallel_aggregate:
+        for key in serial_aggregate:
+            print(f"  {key}: {serial_aggregate[key]!r} vs {parallel_aggregate[key]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for RefinementProcessSummary layouts.
+
+Compares the legacy layout (a plain class whose refinement_history is a list
+of nested dicts) with the slotted dataclass records used by the refinement
+engine, for a batch of summaries held in memory at once.
+
+Usage:
+    python benchmark_summary_memory.py --summaries 20000 --iterations 3
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from refinement_engine import RefinementEngine
+
+
+class LegacyRefinementProcessSummary:
+    """The pre-dataclass summary layout, kept here for comparison only."""
+
+    def __init__(self, initial_plan, final_plan, iterations, converged,
+                 improvement_score, total_time, refinement_history=None):
+        self.initial_plan = initial_plan
+        self.final_plan = final_plan
+        self.iterations = iterations
+        self.converged = converged
+        self.improvement_score = improvement_score
+        self.total_time = total_time
+        self.refinement_history = refinement_history or []
+
+
+def build_slotted(engine, problem, count):
+    """Build count summaries using the slotted record types."""
+    summaries = []
+    for _ in range(count):
+        summary = engine.refine_plan(problem)
+        # Give every summary its own plans, as independent runs would have.
+        summary.initial_plan = dict(summary.initial_plan)
+        summary.final_plan = dict(summary.final_plan)
+        summaries.append(summary)
+    return summaries
+
+
+def build_legacy(engine, problem, count):
+    """Build count summaries using the legacy nested-dict layout."""
+    summaries = []
+    for _ in range(count):
+        summary = engine.refine_plan(problem).to_dict()
+        summaries.append(LegacyRefinementProcessSummary(
+            initial_plan=dict(summary['initial_plan']),
+            final_plan=dict(summary['final_plan']),
+            iterations=summary['iterations'],
+            converged=summary['converged'],
+            improvement_score=summary['improvement_score'],
+            total_time=summary['total_time'],
+            refinement_history=summary['refinement_history']
+        ))
+    return summaries
+
+
+def measure(builder, engine, problem, count):
+    """Return the bytes retained by the summaries a builder produces."""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    summaries = builder(engine, problem, count)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del summaries
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare summary memory layouts')
+    parser.add_argument('--summaries', type=int, default=20000,
+                        help='Number of summaries to keep in memory (default: 20000)')
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='Refinement iterations per summary (default: 3)')
+    args = parser.parse_args()
+
+    # A threshold above any score makes every run use exactly --iterations.
+    engine = RefinementEngine(max_iterations=args.iterations, quality_threshold=2.0,
+                              convergence_epsilon=-1.0)
+    problem = {'type': 'travel', 'goal': 'Plan a 3-day trip to Paris within budget'}
+
+    legacy = measure(build_legacy, engine, problem, args.summaries)
+    slotted = measure(build_slotted, engine, problem, args.summaries)
+
+    print("=" * 60)
+    print("RefinementProcessSummary memory benchmark")
+    print("=" * 60)
+    print(f"Summaries: {args.summaries}  Iterations each: {args.iterations}")
+    print(f"Legacy (dict history):    {legacy / 1024 / 1024:8.2f} MiB "
+          f"({legacy / args.summaries:,.0f} B/summary)")
+    print(f"Slotted (dataclass):      {slotted / 1024 / 1024:8.2f} MiB "
+          f"({slotted / args.summaries:,.0f} B/summary)")
+    print(f"Reduction:                {(1 - slotted / legacy) * 100:8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Process-pool scenario runner, result statistics and LLM flags shared by the CLIs."""
+
+import contextlib
+import csv
+import io
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Any, Callable, List, Tuple
+
+from evaluation_stats import EvaluationStats
+from result_sink import JSONLResultSink
+
+
+def add_llm_arguments(parser):
+    """Add the LLM client, caching, rate-limit and mock-model flags to parser."""
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Evaluate scenarios in this many worker processes, which split '
+                             '--rpm, --tpm and --max-concurrency between them (default: 1)')
+    parser.add_argument('--results-jsonl', type=str, metavar='PATH',
+                        help='JSONL file multi-scenario results stream to (default: the run directory)')
+    parser.add_argument('--checkpoint-dir', type=str,
+                        help='Checkpoint finished refinement iterations here and resume from them')
+    parser.add_argument('--response-cache', type=str,
+                        help='SQLite file caching LLM responses by provider, model, params and prompt')
+    parser.add_argument('--cache-mode', choices=['read_write', 'record', 'replay'],
+                        default='read_write',
+                        help='Response cache mode; replay never calls the LLM (default: read_write)')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='Share one LLM request between identical concurrent prompts')
+    parser.add_argument('--rpm', type=int,
+                        help='Client-side requests-per-minute limit for the provider')
+    parser.add_argument('--tpm', type=int,
+                        help='Client-side tokens-per-minute limit for the provider')
+    parser.add_argument('--max-concurrency', type=int,
+                        help='Ceiling for adaptive in-flight requests to the provider')
+    parser.add_argument('--batch-size', type=int,
+                        help='Micro-batch up to this many concurrent prompts (local models)')
+    parser.add_argument('--batch-wait-ms', type=float, default=10,
+                        help='Milliseconds a micro-batch waits to fill (default: 10)')
+    parser.add_argument('--hedge', action='store_true',
+                        help='Duplicate LLM calls slower than the observed p95 latency')
+    parser.add_argument('--hedge-provider', type=str,
+                        help='Send hedged duplicates to this provider instead of the primary')
+    parser.add_argument('--mock-latency', type=float, metavar='SCALE',
+                        help="Give mock LLMs their provider profile's latency, scaled by SCALE")
+    parser.add_argument('--mock-error-rate', type=float, default=0.0,
+                        help='Fraction of mock LLM calls that fail with an injected error')
+    parser.add_argument('--mock-throttle-rate', type=float, default=0.0,
+                        help='Fraction of mock LLM calls rejected as throttled (HTTP 429)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the mock latency and failure model (default: 0)')
+    parser.add_argument('--prompt-budget', type=int,
+                        help='Feed refinement feedback into prompts within this many tokens')
+
+
+def llm_kwargs_from_args(args, llm_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the settings chosen by the add_llm_arguments flags (and --api-key,
+    --base-url, --http2) to llm_kwargs and return it."""
+    if args.api_key:
+        llm_kwargs['api_key'] = args.api_key
+    if args.base_url:
+        llm_kwargs['base_url'] = args.base_url
+    if args.http2:
+        llm_kwargs['http2'] = True
+    if args.checkpoint_dir:
+        llm_kwargs['checkpoint_dir'] = args.checkpoint_dir
+    if args.response_cache:
+        llm_kwargs['response_cache'] = args.response_cache
+        llm_kwargs['cache_mode'] = args.cache_mode
+    if args.coalesce:
+        llm_kwargs['coalesce'] = True
+    if args.rpm:
+        llm_kwargs['rate_limit_rpm'] = args.rpm
+    if args.tpm:
+        llm_kwargs['rate_limit_tpm'] = args.tpm
+    if args.max_concurrency:
+        llm_kwargs['max_concurrency'] = args.max_concurrency
+    if args.batch_size:
+        llm_kwargs['batch_size'] = args.batch_size
+        llm_kwargs['batch_wait_ms'] = args.batch_wait_ms
+    if args.hedge:
+        llm_kwargs['hedge'] = True
+        if args.hedge_provider:
+            llm_kwargs['hedge_provider'] = args.hedge_provider
+    if args.mock_latency:
+        llm_kwargs['latency_profile'] = True
+        llm_kwargs['latency_scale'] = args.mock_latency
+    if args.mock_latency or args.mock_error_rate or args.mock_throttle_rate:
+        llm_kwargs['error_rate'] = args.mock_error_rate
+        llm_kwargs['throttle_rate'] = args.mock_throttle_rate
+        llm_kwargs['latency_seed'] = args.seed
+    if args.prompt_budget:
+        llm_kwargs['prompt_token_budget'] = args.prompt_budget
+    return llm_kwargs
+
+
+def per_worker_limits(llm_kwargs: Dict[str, Any], workers: int) -> Dict[str, Any]:
+    """Return llm_kwargs with the rate limits divided between worker processes.
+
+    Every worker builds its own limiter, so each gets its share of the
+    requests and tokens per minute and at least one concurrent request.
+    """
+    llm_kwargs = dict(llm_kwargs)
+    for key in ('rate_limit_rpm', 'rate_limit_tpm'):
+        if llm_kwargs.get(key):
+            llm_kwargs[key] = llm_kwargs[key] / workers
+    if llm_kwargs.get('max_concurrency'):
+        llm_kwargs['max_concurrency'] = max(1, llm_kwargs['max_concurrency'] // workers)
+    return llm_kwargs
+
+
+def evaluate_in_processes(loaded: List[Tuple[str, Dict[str, Any]]], workers: int,
+                          create_engine: Callable, engine_args: tuple, engine_kwargs: Dict[str, Any],
+                          evaluate: Callable, deliver: Callable, report: Callable):
+    """Evaluate (scenario name, problem) pairs over a process pool.
+
+    Each worker builds its engine once with create_engine(*engine_args,
+    **engine_kwargs) and runs evaluate(engine, scenario_name, problem) per
+    scenario, which returns the result or None on failure; all three must
+    be picklable. LLM rate limits in engine_kwargs are split between the
+    workers with per_worker_limits. In the parent, report(position, total, scenario_name,
+    result, output) prints each scenario's captured output as it finishes,
+    and deliver(result) gets the successful results in input order.
+
+    Chunks are submitted lazily, so at most 2 * workers of them are out
+    but undelivered; that bounds both the queued tasks and the buffer of
+    results waiting for an earlier, slower scenario.
+    """
+    # Several scenarios per task keep inter-process overhead low on large
+    # sets while still leaving enough tasks to balance the workers
+    chunk_size = max(1, len(loaded) // (workers * 8))
+    indexed = list(enumerate(loaded))
+    chunks = [indexed[start:start + chunk_size] for start in range(0, len(indexed), chunk_size)]
+    window = 2 * workers
+    engine_kwargs = per_worker_limits(engine_kwargs, workers)
+    # Failed scenarios hold None here just to advance next_index
+    pending = {}
+    next_index = 0
+    finished = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        submitted = 0
+        while next_index < len(loaded):
+            while submitted < len(chunks) and submitted < next_index // chunk_size + window:
+                future = pool.submit(evaluate_scenario_task, chunks[submitted], create_engine,
+                                     engine_args, engine_kwargs, evaluate)
+                futures[future] = chunks[submitted]
+                submitted += 1
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = futures.pop(future)
+                try:
+                    outcomes = future.result()
+                except Exception as e:
+                    outcomes = [(index, None, f"Error evaluating {scenario_name}: {e}\n")
+                                for index, (scenario_name, _) in chunk]
+
+                for index, result, output in outcomes:
+                    finished += 1
+                    report(finished, len(loaded), loaded[index][0], result, output)
+                    pending[index] = result
+
+            while next_index in pending:
+                result = pending.pop(next_index)
+                if result is not None:
+                    deliver(result)
+                next_index += 1
+
+
+# Engines of the current worker process, keyed by how they were created
+_worker_engines = {}
+
+
+def evaluate_scenario_task(indexed_scenarios: List[Tuple[int, Tuple[str, Dict[str, Any]]]],
+                           create_engine: Callable, engine_args: tuple,
+                           engine_kwargs: Dict[str, Any],
+                           evaluate: Callable) -> List[Tuple[int, Any, str]]:
+    """Refine and evaluate a chunk of (input index, (name, problem)) scenarios in a worker.
+
+    Scenario reports are captured rather than printed, so the parent can
+    print each one in one piece. Returns (input index, result or None,
+    captured output) per scenario.
+    """
+    key = (create_engine.__module__, create_engine.__qualname__, repr(engine_args),
+           repr(sorted(engine_kwargs.items())))
+    if key not in _worker_engines:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _worker_engines[key] = create_engine(*engine_args, **engine_kwargs)
+    engine = _worker_engines[key]
+
+    outcomes = []
+    for index, (scenario_name, problem) in indexed_scenarios:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = evaluate(engine, scenario_name, problem)
+        outcomes.append((index, result, output.getvalue()))
+    return outcomes
+
+
+def result_stats(results) -> EvaluationStats:
+    """Single-pass statistics of a result list or JSONLResultSink."""
+    if isinstance(results, JSONLResultSink):
+        return results.stats
+    return EvaluationStats.from_results(results)
+
+
+def aggregate_results(results: List[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Average quality, improvement, success rate and iterations over results.
+
+    The means come from one pass of an EvaluationStats accumulator, which
+    updates each metric's running mean (Welford) result by result rather
+    than summing. A JSONLResultSink answers from the accumulator it kept
+    while streaming, without reading the results back.
+    """
+    return result_stats(results).to_dict()
+
+
+def write_results_csv(results, export_path: str):
+    """Write one summary row per result (a list or JSONLResultSink) to a CSV file."""
+    fieldnames = ['scenario', 'initial_quality', 'final_quality', 'improvement',
+                  'improvement_percent', 'converged', 'iterations', 'time_seconds',
+                  'llm_provider', 'llm_model']
+    with open(export_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        # One row per result as it is read, so a streamed sink is never loaded whole
+        for result in results:
+            metrics = EvaluationStats.metrics_of(result)
+            llm_info = result.get('llm_info', {})
+            writer.writerow({
+                'scenario': result['scenario'],
+                'initial_quality': metrics['initial_quality'],
+                'final_quality': metrics['final_quality'],
+                'improvement': metrics['improvement'],
+                'improvement_percent': (metrics['improvement'] / max(0.001, metrics['initial_quality'])) * 100,
+                'converged': result['refinement_result']['converged'],
+                'iterations': metrics['iterations'],
+                'time_seconds': metrics['time_seconds'],
+                'llm_provider': llm_info.get('provider', 'unknown'),
+                'llm_model': llm_info.get('model', 'unknown')
+            })
@@ -0,0 +1,253 @@
+"""Single-pass, mergeable statistics over evaluation results."""
+
+import math
+from typing import Dict, Any, Iterable, Optional
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch over log-spaced buckets.
+
+    Values fall into buckets whose bounds grow by a factor gamma, so every
+    quantile estimate is within relative_accuracy of a true sample value
+    while memory grows only with the logarithm of the value range. Bucket
+    counts simply add up, so sketches built in different processes merge
+    exactly.
+    """
+
+    __slots__ = ('relative_accuracy', 'gamma', '_log_gamma', 'positive', 'negative',
+                 'zero_count', 'count')
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float):
+        self.count += 1
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero_count += 1
+
+    def merge(self, other: 'QuantileSketch'):
+        """Fold other, built with the same relative_accuracy, into this sketch."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1); None while empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+
+class OnlineStats:
+    """Count, mean, variance (Welford), min, max and quantiles of one metric."""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'sketch')
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: 'OnlineStats'):
+        """Combine with stats over disjoint samples (Chan et al. parallel update)."""
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+        else:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.count = count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 below two samples)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Sketch estimate of the q-quantile, kept within the observed range."""
+        estimate = self.sketch.quantile(q)
+        if estimate is None:
+            return None
+        return min(max(estimate, self.min), self.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'stdev': self.stdev,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99)
+        }
+
+
+class EvaluationStats:
+    """Single-pass accumulator for evaluation results.
+
+    update() folds one result into per-metric OnlineStats overall, per LLM
+    provider and per scenario, so summaries and exports never rescan the
+    result list. Accumulators built in separate worker processes or runs
+    combine with merge(); folding the same results in the same order always
+    gives bit-identical statistics.
+
+    Usage:
+        stats = EvaluationStats.from_results(results)
+        print(stats.to_dict()['avg_final_quality'])
+        print(stats.summary()['by_provider'])
+    """
+
+    METRICS = ('initial_quality', 'final_quality', 'improvement', 'iterations', 'time_seconds')
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.converged = 0
+        self.llm_provider = None
+        self.overall = self._new_group()
+        self.by_provider = {}
+        self.by_scenario = {}
+
+    def _new_group(self) -> Dict[str, OnlineStats]:
+        return {metric: OnlineStats(self.relative_accuracy) for metric in self.METRICS}
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]], **kwargs) -> 'EvaluationStats':
+        stats = cls(**kwargs)
+        for result in results:
+            stats.update(result)
+        return stats
+
+    @staticmethod
+    def metrics_of(result: Dict[str, Any]) -> Dict[str, float]:
+        """Extract the tracked metrics from one evaluation result."""
+        initial = result['metrics_before']['quality_metrics']['overall_quality_score']
+        final = result['metrics_after']['quality_metrics']['overall_quality_score']
+        refinement = result['refinement_result']
+        return {
+            'initial_quality': initial,
+            'final_quality': final,
+            'improvement': final - initial,
+            'iterations': refinement['iterations'],
+            'time_seconds': refinement.get('total_time', 0.0)
+        }
+
+    def update(self, result: Dict[str, Any]):
+        """Fold one evaluation result into the statistics."""
+        provider = result.get('llm_info', {}).get('provider', 'unknown')
+        scenario = result.get('scenario', 'unknown')
+        if provider not in self.by_provider:
+            self.by_provider[provider] = self._new_group()
+        if scenario not in self.by_scenario:
+            self.by_scenario[scenario] = self._new_group()
+
+        self.count += 1
+        self.converged += 1 if result['refinement_result']['converged'] else 0
+        if self.llm_provider is None:
+            self.llm_provider = provider
+        for metric, value in self.metrics_of(result).items():
+            self.overall[metric].add(value)
+            self.by_provider[provider][metric].add(value)
+            self.by_scenario[scenario][metric].add(value)
+
+    def merge(self, other: 'EvaluationStats'):
+        """Fold in stats accumulated over other results, e.g. by another worker."""
+        self.count += other.count
+        self.converged += other.converged
+        if self.llm_provider is None:
+            self.llm_provider = other.llm_provider
+        self._merge_group(self.overall, other.overall)
+        for groups, other_groups in ((self.by_provider, other.by_provider),
+                                     (self.by_scenario, other.by_scenario)):
+            for name, group in other_groups.items():
+                if name not in groups:
+                    groups[name] = self._new_group()
+                self._merge_group(groups[name], group)
+
+    @staticmethod
+    def _merge_group(group: Dict[str, OnlineStats], other: Dict[str, OnlineStats]):
+        for metric, stats in other.items():
+            group[metric].merge(stats)
+
+    def to_dict(self) -> Dict[str, float]:
+        """Return the headline means and success rate (all zero while empty)."""
+        return {
+            'avg_initial_quality': self.overall['initial_quality'].mean,
+            'avg_final_quality': self.overall['final_quality'].mean,
+            'avg_improvement': self.overall['improvement'].mean,
+            'success_rate': self.converged / self.count if self.count else 0.0,
+            'avg_iterations': self.overall['iterations'].mean
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Return per-metric statistics overall, per provider and per scenario."""
+        def describe(group):
+            return {metric: stats.to_dict() for metric, stats in group.items()}
+
+        return {
+            'count': self.count,
+            'converged': self.converged,
+            'overall': describe(self.overall),
+            'by_provider': {name: describe(group) for name, group in self.by_provider.items()},
+            'by_scenario': {name: describe(group) for name, group in self.by_scenario.items()}
+        }
@@ -0,0 +1,305 @@
+"""Shared, connection-pooled HTTP transport for HTTP-backed LLM providers."""
+
+import http.client
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+except ImportError:  # Optional: only needed for HTTP/2
+    httpx = None
+
+
+class TransportResponse:
+    """Status, headers and body of one HTTP response.
+
+    headers looks names up case-insensitively, as HTTP/2 sends them in
+    lower case.
+    """
+
+    def __init__(self, status, headers, body, will_close=False):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.will_close = will_close
+
+    def json(self):
+        """Decode the body as JSON."""
+        return json.loads(self.body)
+
+
+class PooledTransport:
+    """Keep-alive HTTP transport with a bounded connection pool per host.
+
+    Idle connections are reused across requests and threads; at most
+    max_connections are open to any one host at a time, and further callers
+    wait for one to be released. With http2=True and httpx (plus h2)
+    installed, requests go through a pooled httpx client that negotiates
+    HTTP/2 instead.
+    """
+
+    # Errors that mean a reused keep-alive connection was closed by the server.
+    _STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError,
+                     ConnectionResetError, http.client.CannotSendRequest)
+
+    def __init__(self, max_connections=10, timeout=30.0, http2=False):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.http2 = bool(http2 and httpx is not None)
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._stats = {
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'stale_retries': 0
+        }
+        self._client = None
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True, timeout=timeout,
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+            )
+
+    def request(self, method, url, body=None, headers=None, timeout=None) -> TransportResponse:
+        """Send one request, reusing a pooled connection to the host when possible."""
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            headers = {'Content-Type': 'application/json', **(headers or {})}
+        self._count('requests')
+
+        if self._client is not None:
+            response = self._client.request(method, url, content=body, headers=headers,
+                                            timeout=timeout or self.timeout)
+            return TransportResponse(response.status_code, response.headers, response.content)
+
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        pool = self._pool_for(parts.scheme, parts.hostname, parts.port)
+
+        pool.slots.acquire()
+        try:
+            connection, reused = pool.checkout(timeout or self.timeout)
+            try:
+                response = self._send(connection, method, path, body, headers)
+            except self._STALE_ERRORS:
+                connection.close()
+                if not reused:
+                    raise
+                self._count('stale_retries')
+                connection, _ = pool.checkout(timeout or self.timeout, fresh=True)
+                try:
+                    response = self._send(connection, method, path, body, headers)
+                except Exception:
+                    connection.close()
+                    raise
+            except Exception:
+                connection.close()
+                raise
+            pool.checkin(connection, response)
+            return response
+        finally:
+            pool.slots.release()
+
+    def _send(self, connection, method, path, body, headers):
+        connection.request(method, path, body=body, headers=headers or {})
+        raw = connection.getresponse()
+        return TransportResponse(raw.status, raw.msg, raw.read(), raw.will_close)
+
+    def _pool_for(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = _HostPool(self, scheme, host, port)
+            return self._pools[key]
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters and the idle connections per host."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle_connections'] = {
+                f"{scheme}://{host}:{port}": pool.idle.qsize()
+                for (scheme, host, port), pool in self._pools.items()
+            }
+        stats['backend'] = 'httpx-http2' if self._client is not None else 'http.client'
+        stats['max_connections'] = self.max_connections
+        return stats
+
+    def close(self):
+        """Close every idle connection (and the httpx client, if any)."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            pool.close()
+        if self._client is not None:
+            self._client.close()
+
+
+class _HostPool:
+    """Idle keep-alive connections to a single scheme/host/port."""
+
+    def __init__(self, transport, scheme, host, port):
+        self.transport = transport
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.slots = threading.BoundedSemaphore(transport.max_connections)
+        self.idle = queue.LifoQueue()
+
+    def checkout(self, timeout, fresh=False):
+        """Return (connection, reused), preferring the most recently used idle one."""
+        if not fresh:
+            try:
+                connection = self.idle.get_nowait()
+                self.transport._count('connections_reused')
+                return connection, True
+            except queue.Empty:
+                pass
+
+        connection_class = (http.client.HTTPSConnection if self.scheme == 'https'
+                            else http.client.HTTPConnection)
+        self.transport._count('connections_created')
+        return connection_class(self.host, self.port, timeout=timeout), False
+
+    def checkin(self, connection, response):
+        """Return a connection to the pool unless the server is closing it."""
+        if response.will_close:
+            connection.close()
+        else:
+            self.idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# Process-wide transports, one per distinct configuration
+_shared_transports = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(http2=False, **kwargs) -> PooledTransport:
+    """Return the process-wide transport for this configuration, creating it on first use.
+
+    Callers asking for the same settings (e.g. http2=True) share one pool;
+    different settings get their own transport rather than silently
+    reusing one configured otherwise.
+    """
+    key = (bool(http2),) + tuple(sorted(kwargs.items()))
+    with _shared_lock:
+        if key not in _shared_transports:
+            _shared_transports[key] = PooledTransport(http2=http2, **kwargs)
+        return _shared_transports[key]
+
+
+def reset_shared_transport():
+    """Close and drop the process-wide transports (mainly for tests)."""
+    with _shared_lock:
+        transports = list(_shared_transports.values())
+        _shared_transports.clear()
+    for transport in transports:
+        transport.close()
+
+
+class StubLLMServer:
+    """Local OpenAI-style completion server for exercising HTTP providers offline.
+
+    Serves POST /v1/completions and GET /v1/models over keep-alive HTTP/1.1
+    and counts the TCP connections it accepts, so tests can check that
+    requests share pooled connections.
+
+    Usage:
+        with StubLLMServer(latency=0.01) as server:
+            llm = LLMFactory.create_llm('http', 'stub-model', base_url=server.url)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, reply="This is a stub response."):
+        self.latency = latency
+        self.reply = reply
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == '/v1/models':
+                    self._reply(200, {'data': [{'id': 'stub-model'}]})
+                else:
+                    self._reply(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                prompt = payload.get('prompt', '')
+                self._reply(200, {
+                    'model': payload.get('model'),
+                    'choices': [{'text': stub.reply}],
+                    'usage': {'prompt_tokens': max(1, len(prompt) // 4),
+                              'completion_tokens': max(1, len(stub.reply) // 4)}
+                })
+
+            def _reply(self, status, data):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
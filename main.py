@@ -7,7 +7,7 @@ import argparse
 import json
 import os
 import sys
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 
 # Add parent directory to path
 sys.path.append('/Users/mohamedelhajsuliman/Desktop/Mohamed 2025 summer thesis')
@@ -18,7 +18,11 @@ sys.path.append('/Users/mohamedelhajsuliman/Desktop/Mohamed 2025 summer thesis')
 from srlp_framework.core.evaluator import Evaluator
 from srlp_framework.core.metrics_calculator import BasicMetricsCalculator
 from srlp_framework.core.refinement_engine import RefinementEngine
-from refinement_engine import create_refinement_engine
+from refinement_engine import create_refinement_engine, encode_results_json, public_result
+from evaluation_runner import (add_llm_arguments, evaluate_in_processes, llm_kwargs_from_args,
+                               result_stats, write_results_csv)
+from result_sink import JSONLResultSink
+from run_manifest import RunManifest
 from srlp_framework.test_scenarios import get_scenario_by_name, get_all_test_scenarios, load_scenario_from_file
 from srlp_framework.utils.visualization import generate_all_visualizations
 from srlp_framework.llm_providers import LLMFactory, list_available_providers
@@ -46,26 +50,7 @@ def run_single_evaluation(problem_file: str = None, scenario: str = None,
     """
     
     # Load problem
-    if problem_file:
-        if not os.path.exists(problem_file):
-            raise FileNotFoundError(f"Problem file not found: {problem_file}")
-        
-        with open(problem_file, 'r') as f:
-            scenario_data = json.load(f)
-        
-        scenario_name = scenario_data.get('name', 'custom_scenario')
-        problem = scenario_data.get('problem', scenario_data)
-        
-    elif scenario:
-        scenario_data = get_scenario_by_name(scenario)
-        scenario_name = scenario_data['name']
-        problem = scenario_data['problem']
-        
-    else:
-        # Default to travel scenario
-        scenario_data = get_scenario_by_name('travel')
-        scenario_name = scenario_data['name']
-        problem = scenario_data['problem']
+    scenario_name, problem = load_problem(problem_file, scenario)
     
     print(f"Running SRLP evaluation: {scenario_name}")
     print(f"Problem: {problem.get('goal', 'No goal specified')}")
@@ -76,21 +61,7 @@ def run_single_evaluation(problem_file: str = None, scenario: str = None,
     print()
     
     # Create LLM-enabled components
-    try:
-        # Create refinement engine with the specified provider
-        refinement_engine = create_refinement_engine(provider=provider, model=model, **llm_kwargs)
-        
-        # Get provider info
-        provider_info = refinement_engine.llm.get_provider_info()
-        print(f"Using LLM: {provider_info}")
-        
-    except Exception as e:
-        print(f"Error initializing {provider} provider: {e}")
-        print("Falling back to mock provider...")
-        refinement_engine = create_refinement_engine(provider="mock")
-    
-    # Initialize other components
-    calculator = BasicMetricsCalculator()
+    refinement_engine = create_engine_with_fallback(provider, model, **llm_kwargs)
     
     # Run evaluation
     if evaluate:
@@ -98,67 +69,7 @@ def run_single_evaluation(problem_file: str = None, scenario: str = None,
         
         # Use the LLM-enabled refinement engine
         refinement_result = refinement_engine.refine_plan(problem)
-        
-        # Extract metrics
-        initial_plan = refinement_result.initial_plan
-        final_plan = refinement_result.final_plan
-        
-        # Get check results
-        initial_check_data = refinement_result.refinement_history[0]['check_result']
-        final_check_data = refinement_result.refinement_history[-1]['check_result']
-        
-        # Convert to CheckResult objects
-        from srlp_framework.core.self_checker import CheckResult
-        
-        initial_check = CheckResult(
-            overall_score=initial_check_data['overall_score'],
-            error_count=initial_check_data['error_count'],
-            errors=initial_check_data['errors'],
-            constraint_violations=initial_check_data['constraint_violations'],
-            uncertainty_scores=initial_check_data['uncertainty_scores'],
-            semantic_consistency=initial_check_data['semantic_consistency'],
-            completeness_score=initial_check_data['completeness_score']
-        )
-        
-        final_check = CheckResult(
-            overall_score=final_check_data['overall_score'],
-            error_count=final_check_data['error_count'],
-            errors=final_check_data['errors'],
-            constraint_violations=final_check_data['constraint_violations'],
-            uncertainty_scores=final_check_data['uncertainty_scores'],
-            semantic_consistency=final_check_data['semantic_consistency'],
-            completeness_score=final_check_data['completeness_score']
-        )
-        
-        # Calculate metrics
-        metrics_before = calculator.calculate_metrics(initial_plan, problem, initial_check)
-        metrics_after = calculator.calculate_metrics(final_plan, problem, final_check)
-        improvement_metrics = calculator.compare_metrics(metrics_before, metrics_after)
-        
-        # Display results
-        print("Results:")
-        print("-" * 40)
-        print(f"Initial Quality: {metrics_before.quality_metrics['overall_quality_score']:.3f}")
-        print(f"Final Quality: {metrics_after.quality_metrics['overall_quality_score']:.3f}")
-        print(f"Improvement: {improvement_metrics['overall_quality_score_absolute_improvement']:+.3f}")
-        print(f"Relative Improvement: {improvement_metrics['overall_quality_score_relative_improvement']:+.1f}%")
-        print(f"Iterations: {refinement_result.iterations}")
-        print(f"Converged: {'Yes' if refinement_result.converged else 'No'}")
-        print(f"Processing Time: {refinement_result.total_time:.2f}s")
-        provider_info = refinement_engine.llm.get_provider_info()
-        print(f"LLM Provider: {provider_info.get('provider', 'unknown')}")
-        print(f"LLM Model: {provider_info.get('model', 'unknown')}")
-        
-        # Prepare results
-        results = {
-            'scenario': scenario_name,
-            'problem': problem,
-            'refinement_result': refinement_result.to_dict(),
-            'metrics_before': metrics_before.to_dict(),
-            'metrics_after': metrics_after.to_dict(),
-            'improvement_metrics': improvement_metrics,
-            'llm_info': provider_info
-        }
+        results = evaluate_refinement(scenario_name, problem, refinement_result, refinement_engine)
         
     else:
         # Simple refinement without full evaluation
@@ -178,13 +89,14 @@ def run_single_evaluation(problem_file: str = None, scenario: str = None,
         results = {
             'scenario': scenario_name,
             'problem': problem,
-            'refinement_result': refinement_result.to_dict(),
+            'refinement_result': refinement_result,
             'llm_info': provider_info
         }
     
     # Export results
     if export:
         export_results(results, export, evaluate)
+    results = public_result(results)
     
     # Generate visualizations
     if visualize and evaluate:
@@ -196,22 +108,150 @@ def run_single_evaluation(problem_file: str = None, scenario: str = None,
     return results
 
 
+def load_problem(problem_file: str = None, scenario: str = None):
+    """Load a problem from a file or a predefined scenario (travel by default)."""
+    
+    if problem_file:
+        if not os.path.exists(problem_file):
+            raise FileNotFoundError(f"Problem file not found: {problem_file}")
+        
+        with open(problem_file, 'r') as f:
+            scenario_data = json.load(f)
+        
+        return scenario_data.get('name', 'custom_scenario'), scenario_data.get('problem', scenario_data)
+    
+    scenario_data = get_scenario_by_name(scenario or 'travel')
+    return scenario_data['name'], scenario_data['problem']
+
+
+# Refinement settings that a mock fallback engine keeps
+ENGINE_SETTINGS = ('max_iterations', 'quality_threshold', 'convergence_epsilon')
+
+
+def create_engine_with_fallback(provider: str = "mock", model: str = None, **llm_kwargs):
+    """Create a refinement engine for a provider, falling back to mock on failure."""
+    
+    try:
+        # Create refinement engine with the specified provider
+        refinement_engine = create_refinement_engine(provider=provider, model=model, **llm_kwargs)
+        
+        # Get provider info
+        provider_info = refinement_engine.llm.get_provider_info()
+        print(f"Using LLM: {provider_info}")
+        
+    except Exception as e:
+        print(f"Error initializing {provider} provider: {e}")
+        print("Falling back to mock provider...")
+        settings = {key: llm_kwargs[key] for key in ENGINE_SETTINGS if key in llm_kwargs}
+        refinement_engine = create_refinement_engine(provider="mock", **settings)
+    
+    return refinement_engine
+
+
+def evaluate_refinement(scenario_name: str, problem: Dict[str, Any], refinement_result,
+                        refinement_engine) -> Dict[str, Any]:
+    """Calculate, display and collect metrics for a finished refinement."""
+    
+    calculator = BasicMetricsCalculator()
+    
+    # Extract metrics
+    initial_plan = refinement_result.initial_plan
+    final_plan = refinement_result.final_plan
+    
+    # Get check results
+    initial_check_data = refinement_result.refinement_history[0]['check_result']
+    final_check_data = refinement_result.refinement_history[-1]['check_result']
+    
+    # Convert to CheckResult objects
+    from srlp_framework.core.self_checker import CheckResult
+    
+    initial_check = CheckResult(
+        overall_score=initial_check_data['overall_score'],
+        error_count=initial_check_data['error_count'],
+        errors=initial_check_data['errors'],
+        constraint_violations=initial_check_data['constraint_violations'],
+        uncertainty_scores=initial_check_data['uncertainty_scores'],
+        semantic_consistency=initial_check_data['semantic_consistency'],
+        completeness_score=initial_check_data['completeness_score']
+    )
+    
+    final_check = CheckResult(
+        overall_score=final_check_data['overall_score'],
+        error_count=final_check_data['error_count'],
+        errors=final_check_data['errors'],
+        constraint_violations=final_check_data['constraint_violations'],
+        uncertainty_scores=final_check_data['uncertainty_scores'],
+        semantic_consistency=final_check_data['semantic_consistency'],
+        completeness_score=final_check_data['completeness_score']
+    )
+    
+    # Calculate metrics
+    metrics_before = calculator.calculate_metrics(initial_plan, problem, initial_check)
+    metrics_after = calculator.calculate_metrics(final_plan, problem, final_check)
+    improvement_metrics = calculator.compare_metrics(metrics_before, metrics_after)
+    
+    # Display results
+    print("Results:")
+    print("-" * 40)
+    print(f"Initial Quality: {metrics_before.quality_metrics['overall_quality_score']:.3f}")
+    print(f"Final Quality: {metrics_after.quality_metrics['overall_quality_score']:.3f}")
+    print(f"Improvement: {improvement_metrics['overall_quality_score_absolute_improvement']:+.3f}")
+    print(f"Relative Improvement: {improvement_metrics['overall_quality_score_relative_improvement']:+.1f}%")
+    print(f"Iterations: {refinement_result.iterations}")
+    print(f"Converged: {'Yes' if refinement_result.converged else 'No'}")
+    print(f"Processing Time: {refinement_result.total_time:.2f}s")
+    print(f"Tokens: {refinement_result.usage.get('total_tokens', 0)} "
+          f"(cost ${refinement_result.usage.get('cost_usd', 0.0):.4f})")
+    prompt_budget = refinement_result.refinement_history[-1].get('prompt_budget')
+    if prompt_budget:
+        print(f"Prompt Budget: {prompt_budget['prompt_tokens']}/{prompt_budget['budget']} tokens "
+              f"({prompt_budget['compacted']} compacted, {prompt_budget['dropped']} dropped)")
+    provider_info = refinement_engine.llm.get_provider_info()
+    print(f"LLM Provider: {provider_info.get('provider', 'unknown')}")
+    print(f"LLM Model: {provider_info.get('model', 'unknown')}")
+    
+    return {
+        'scenario': scenario_name,
+        'problem': problem,
+        'refinement_result': refinement_result,
+        'metrics_before': metrics_before.to_dict(),
+        'metrics_after': metrics_after.to_dict(),
+        'improvement_metrics': improvement_metrics,
+        'llm_info': provider_info
+    }
+
+
 def run_multiple_evaluations(scenarios: List[str] = None, export: str = None, 
                            visualize: bool = False, provider: str = "mock",
-                           model: str = None, **llm_kwargs) -> List[Dict[str, Any]]:
+                           model: str = None, concurrency: int = 1, workers: int = 1,
+                           results_path: str = None, manifest: RunManifest = None,
+                           **llm_kwargs) -> List[Dict[str, Any]]:
     """
     Run evaluations on multiple scenarios with specified LLM provider.
     
+    With workers=1 all scenarios share one refinement engine and are refined
+    through RefinementEngine.refine_plan_many; with more, they are spread
+    over a process pool (see evaluate_scenarios).
+    
+    With results_path results are streamed to a JSONL file instead of being
+    kept in memory, and the JSONLResultSink is returned in place of the list.
+    With a RunManifest, scenarios it records as completed are skipped and
+    results stream to the run's own JSONL file instead of results_path.
+    
     Args:
         scenarios: List of scenario names to evaluate
         export: Path to export aggregate results
         visualize: Whether to generate visualizations
         provider: LLM provider name
         model: Model name (optional)
+        concurrency: Number of scenarios refined concurrently
+        workers: Number of worker processes (1 runs in this process)
+        results_path: JSONL file to stream results to (optional)
+        manifest: Manifest of the run to record completed scenarios in (optional)
         **llm_kwargs: Additional LLM configuration parameters
         
     Returns:
-        List of evaluation results
+        List of evaluation results, or the JSONLResultSink holding them
     """
     
     if scenarios is None:
@@ -219,39 +259,42 @@ def run_multiple_evaluations(scenarios: List[str] = None, export: str = None,
         scenarios = [s['name'] for s in all_scenarios]
     
     print(f"Running SRLP evaluation on {len(scenarios)} scenarios")
+    if manifest is not None:
+        print(f"Run ID: {manifest.run_id} (resume with --resume {manifest.run_id})")
     print(f"LLM Provider: {provider}")
     if model:
         print(f"Model: {model}")
+    if workers > 1:
+        print(f"Worker Processes: {workers}")
     print("=" * 60)
     
-    results = []
+    pending = manifest.pending(scenarios) if manifest is not None else scenarios
+    if len(pending) < len(scenarios):
+        print(f"Skipping {len(scenarios) - len(pending)} scenarios completed earlier in this run")
     
-    for i, scenario_name in enumerate(scenarios, 1):
-        print(f"\n[{i}/{len(scenarios)}] Evaluating: {scenario_name}")
-        print("-" * 40)
-        
+    loaded = []
+    for scenario_name in pending:
         try:
-            result = run_single_evaluation(
-                scenario=scenario_name, 
-                evaluate=True,
-                provider=provider,
-                model=model,
-                **llm_kwargs
-            )
-            results.append(result)
-            
-            # Brief summary
-            before_quality = result['metrics_before']['quality_metrics']['overall_quality_score']
-            after_quality = result['metrics_after']['quality_metrics']['overall_quality_score']
-            improvement = after_quality - before_quality
-            converged = result['refinement_result']['converged']
-            
-            print(f"Quality: {before_quality:.3f} → {after_quality:.3f} ({improvement:+.3f})")
-            print(f"Converged: {'Yes' if converged else 'No'}")
-            
+            loaded.append((scenario_name, load_problem(scenario=scenario_name)[1]))
         except Exception as e:
             print(f"Error evaluating {scenario_name}: {e}")
-            continue
+    
+    if manifest is not None:
+        sink = manifest.open_sink()
+    else:
+        sink = JSONLResultSink(results_path) if results_path else None
+    try:
+        if loaded:
+            results = evaluate_scenarios(loaded, provider, model, concurrency=concurrency,
+                                         workers=workers, sink=sink, **llm_kwargs)
+        else:
+            results = sink if sink is not None else []
+    finally:
+        if sink is not None:
+            sink.close()
+    
+    if manifest is not None and not manifest.pending(scenarios):
+        manifest.finish()
     
     # Generate summary
     if results:
@@ -259,18 +302,21 @@ def run_multiple_evaluations(scenarios: List[str] = None, export: str = None,
         print("AGGREGATE RESULTS")
         print("=" * 60)
         
-        avg_initial = sum(r['metrics_before']['quality_metrics']['overall_quality_score'] 
-                         for r in results) / len(results)
-        avg_final = sum(r['metrics_after']['quality_metrics']['overall_quality_score'] 
-                       for r in results) / len(results)
-        avg_improvement = avg_final - avg_initial
-        success_rate = sum(1 for r in results if r['refinement_result']['converged']) / len(results)
+        stats = result_stats(results)
+        aggregate = stats.to_dict()
+        final_quality = stats.overall['final_quality']
+        avg_initial = aggregate['avg_initial_quality']
+        avg_improvement = aggregate['avg_improvement']
         
         print(f"Scenarios Evaluated: {len(results)}")
         print(f"Average Initial Quality: {avg_initial:.3f}")
-        print(f"Average Final Quality: {avg_final:.3f}")
+        print(f"Average Final Quality: {aggregate['avg_final_quality']:.3f}")
+        print(f"Final Quality Spread: stdev={final_quality.stdev:.3f}, "
+              f"p50={final_quality.quantile(0.5):.3f}, p90={final_quality.quantile(0.9):.3f}")
         print(f"Average Improvement: {avg_improvement:+.3f} ({(avg_improvement/avg_initial)*100:+.1f}%)")
-        print(f"Success Rate: {success_rate:.1%}")
+        print(f"Success Rate: {aggregate['success_rate']:.1%}")
+        if sink is not None:
+            print(f"Results Streamed To: {sink.path}")
         print(f"LLM Provider: {provider}")
         if model:
             print(f"Model: {model}")
@@ -278,17 +324,98 @@ def run_multiple_evaluations(scenarios: List[str] = None, export: str = None,
     # Export results
     if export and results:
         export_aggregate_results(results, export)
+    if not isinstance(results, JSONLResultSink):
+        results = [public_result(result) for result in results]
     
     # Generate visualizations
     if visualize and results:
         print("\nGenerating aggregate visualizations...")
         viz_dir = os.path.join(os.path.dirname(export) if export else 'results', 'visualizations')
-        generate_all_visualizations(results, viz_dir)
+        generate_all_visualizations(list(results), viz_dir)
         print(f"Visualizations saved to: {viz_dir}")
     
     return results
 
 
+def evaluate_scenarios(loaded: List[Tuple[str, Dict[str, Any]]], provider: str = "mock",
+                       model: str = None, concurrency: int = 1, workers: int = 1,
+                       sink: JSONLResultSink = None, **llm_kwargs) -> List[Dict[str, Any]]:
+    """
+    Refine and evaluate (scenario name, problem) pairs, printing each report.
+    
+    With workers > 1 scenarios are distributed over a process pool and each
+    report is printed as its scenario finishes; results are still delivered
+    in input order, so aggregates match a serial run exactly. llm_kwargs
+    must be picklable in that mode. With a sink each result is written to
+    it instead of being collected, and the sink is returned.
+    """
+    
+    results = []
+    deliver = sink.write if sink is not None else results.append
+    if workers > 1:
+        evaluate_in_processes(loaded, workers, create_engine_with_fallback, (provider, model),
+                              llm_kwargs, _evaluate_in_worker, deliver, _report_worker_scenario)
+        return sink if sink is not None else results
+    
+    refinement_engine = create_engine_with_fallback(provider, model, **llm_kwargs)
+    
+    refinements = refinement_engine.refine_plan_many(
+        (problem for _, problem in loaded), concurrency=concurrency,
+        ordered=True, return_exceptions=True
+    )
+    
+    for i, ((scenario_name, problem), refinement_result) in enumerate(zip(loaded, refinements), 1):
+        print(f"\n[{i}/{len(loaded)}] Evaluating: {scenario_name}")
+        print("-" * 40)
+        
+        try:
+            if isinstance(refinement_result, Exception):
+                raise refinement_result
+            
+            result = evaluate_refinement(scenario_name, problem, refinement_result, refinement_engine)
+            deliver(result)
+            print_scenario_summary(result)
+            
+        except Exception as e:
+            print(f"Error evaluating {scenario_name}: {e}")
+            continue
+    
+    return sink if sink is not None else results
+
+
+def _evaluate_in_worker(refinement_engine, scenario_name: str, problem: Dict[str, Any]):
+    """Refine and evaluate one scenario in a worker process; None on failure."""
+    
+    try:
+        refinement_result = refinement_engine.refine_plan(problem)
+        return evaluate_refinement(scenario_name, problem, refinement_result, refinement_engine)
+    except Exception as e:
+        print(f"Error evaluating {scenario_name}: {e}")
+        return None
+
+
+def _report_worker_scenario(position: int, total: int, scenario_name: str, result, output: str):
+    """Print a scenario finished by a worker process in one piece."""
+    
+    print(f"\n[{position}/{total}] Evaluating: {scenario_name}")
+    print("-" * 40)
+    print(output, end='')
+    if result is not None:
+        print_scenario_summary(result)
+
+
+def print_scenario_summary(result: Dict[str, Any]):
+    """Print the quality change and convergence of a scenario."""
+    
+    before_quality = result['metrics_before']['quality_metrics']['overall_quality_score']
+    after_quality = result['metrics_after']['quality_metrics']['overall_quality_score']
+    improvement = after_quality - before_quality
+    converged = result['refinement_result']['converged']
+    
+    print(f"Quality: {before_quality:.3f} → {after_quality:.3f} ({improvement:+.3f})")
+    print(f"Converged: {'Yes' if converged else 'No'}")
+
+
 def export_results(results: Dict[str, Any], export_path: str, full_evaluation: bool = True):
     """Export results to specified format."""
     
@@ -297,8 +424,8 @@ def export_results(results: Dict[str, Any], export_path: str, full_evaluation: b
     
     if export_path.endswith('.json'):
         # Export as JSON
-        with open(export_path, 'w') as f:
-            json.dump(results, f, indent=2)
+        with open(export_path, 'wb') as f:
+            f.write(encode_results_json(results))
         print(f"Results exported to: {export_path}")
         
     elif export_path.endswith('.csv') and full_evaluation:
@@ -330,8 +457,8 @@ def export_results(results: Dict[str, Any], export_path: str, full_evaluation: b
     else:
         # Default to JSON
         json_path = export_path.replace('.csv', '.json') if export_path.endswith('.csv') else export_path + '.json'
-        with open(json_path, 'w') as f:
-            json.dump(results, f, indent=2)
+        with open(json_path, 'wb') as f:
+            f.write(encode_results_json(results))
         print(f"Results exported to: {json_path}")
 
 
@@ -341,59 +468,27 @@ def export_aggregate_results(results: List[Dict[str, Any]], export_path: str):
     os.makedirs(os.path.dirname(export_path), exist_ok=True)
     
     if export_path.endswith('.csv'):
-        # Create summary CSV
-        import csv
-        
-        summary_data = []
-        for result in results:
-            scenario = result['scenario']
-            before_quality = result['metrics_before']['quality_metrics']['overall_quality_score']
-            after_quality = result['metrics_after']['quality_metrics']['overall_quality_score']
-            improvement = after_quality - before_quality
-            converged = result['refinement_result']['converged']
-            iterations = result['refinement_result']['iterations']
-            time_taken = result['refinement_result']['total_time']
-            llm_info = result.get('llm_info', {})
-            
-            summary_data.append({
-                'scenario': scenario,
-                'initial_quality': before_quality,
-                'final_quality': after_quality,
-                'improvement': improvement,
-                'improvement_percent': (improvement / max(0.001, before_quality)) * 100,
-                'converged': converged,
-                'iterations': iterations,
-                'time_seconds': time_taken,
-                'llm_provider': llm_info.get('provider', 'unknown'),
-                'llm_model': llm_info.get('model', 'unknown')
-            })
-        
-        with open(export_path, 'w', newline='') as csvfile:
-            fieldnames = ['scenario', 'initial_quality', 'final_quality', 'improvement', 
-                         'improvement_percent', 'converged', 'iterations', 'time_seconds',
-                         'llm_provider', 'llm_model']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(summary_data)
-            
+        write_results_csv(results, export_path)
     else:
         # Export as JSON
-        aggregate_data = {
-            'summary': {
-                'total_scenarios': len(results),
-                'avg_initial_quality': sum(r['metrics_before']['quality_metrics']['overall_quality_score'] 
-                                         for r in results) / len(results),
-                'avg_final_quality': sum(r['metrics_after']['quality_metrics']['overall_quality_score'] 
-                                       for r in results) / len(results),
-                'success_rate': sum(1 for r in results if r['refinement_result']['converged']) / len(results),
-                'llm_provider': results[0].get('llm_info', {}).get('provider', 'unknown') if results else 'unknown'
-            },
-            'detailed_results': results
+        stats = result_stats(results)
+        averages = stats.to_dict()
+        summary = {
+            'total_scenarios': stats.count,
+            'avg_initial_quality': averages['avg_initial_quality'],
+            'avg_final_quality': averages['avg_final_quality'],
+            'success_rate': averages['success_rate'],
+            'llm_provider': stats.llm_provider or 'unknown',
+            'statistics': stats.summary()
         }
         
         json_path = export_path.replace('.csv', '.json') if export_path.endswith('.csv') else export_path
-        with open(json_path, 'w') as f:
-            json.dump(aggregate_data, f, indent=2)
+        with open(json_path, 'wb') as f:
+            if isinstance(results, JSONLResultSink):
+                # Copy the streamed lines rather than loading every result
+                results.write_json(f, {'summary': summary})
+            else:
+                f.write(encode_results_json({'summary': summary, 'detailed_results': results}))
     
     print(f"Aggregate results exported to: {export_path}")
 
@@ -432,17 +527,22 @@ Examples:
                            help='Multiple scenarios to run')
     input_group.add_argument('--all', action='store_true',
                            help='Run all available scenarios')
+    input_group.add_argument('--resume', type=str, metavar='RUN_ID',
+                           help='Resume a multi-scenario run with its original scenarios, '
+                                'provider, model and settings, skipping completed scenarios')
     
     # LLM Provider options
     llm_group = parser.add_argument_group('LLM Provider Options')
     llm_group.add_argument('--provider', type=str, default='mock',
-                          help='LLM provider (openai, claude, llama, huggingface, mock)')
+                          help='LLM provider (openai, claude, llama, huggingface, transformers, http, mock)')
     llm_group.add_argument('--model', type=str,
                           help='Model name (uses provider default if not specified)')
     llm_group.add_argument('--api-key', type=str,
                           help='API key for the provider (can also use environment variables)')
     llm_group.add_argument('--base-url', type=str,
                           help='Base URL for the provider API')
+    llm_group.add_argument('--http2', action='store_true',
+                          help='Use HTTP/2 for the http provider (needs httpx[http2])')
     llm_group.add_argument('--temperature', type=float, default=0.7,
                           help='Temperature for text generation (default: 0.7)')
     llm_group.add_argument('--max-tokens', type=int, default=1000,
@@ -465,6 +565,11 @@ Examples:
                        help='Maximum refinement iterations (default: 5)')
     parser.add_argument('--quality-threshold', type=float, default=0.8,
                        help='Quality threshold for convergence (default: 0.8)')
+    parser.add_argument('--epsilon', type=float, default=0.01,
+                       help='Stop once an iteration improves the score by less than this (default: 0.01)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Scenarios refined concurrently in multi-scenario runs (default: 1)')
+    add_llm_arguments(parser)
     
     # Utility options
     parser.add_argument('--list-scenarios', action='store_true',
@@ -527,33 +632,46 @@ Examples:
     # Prepare LLM configuration
     llm_kwargs = {
         'temperature': args.temperature,
-        'max_tokens': args.max_tokens
+        'max_tokens': args.max_tokens,
+        'max_iterations': args.iterations,
+        'quality_threshold': args.quality_threshold,
+        'convergence_epsilon': args.epsilon
     }
-    
-    if args.api_key:
-        llm_kwargs['api_key'] = args.api_key
-    if args.base_url:
-        llm_kwargs['base_url'] = args.base_url
+    llm_kwargs_from_args(args, llm_kwargs)
     
     try:
-        if args.all:
-            # Run all scenarios
-            results = run_multiple_evaluations(
-                export=args.export,
-                visualize=args.visualize,
-                provider=args.provider,
-                model=args.model,
-                **llm_kwargs
-            )
+        if args.all or args.scenarios or args.resume:
+            if args.resume:
+                # Replay the original configuration; only the API key is
+                # taken from this invocation since manifests never store it
+                manifest = RunManifest.load(args.resume)
+                config = manifest.config
+                llm_kwargs = dict(config.get('llm_kwargs', {}))
+                if args.api_key:
+                    llm_kwargs['api_key'] = args.api_key
+                print(f"Resuming run {manifest.run_id}: "
+                      f"{len(manifest.completed)} scenarios already completed")
+            else:
+                # Run all scenarios, or the specified ones
+                config = {
+                    'command': 'main',
+                    'scenarios': args.scenarios or [s['name'] for s in get_all_test_scenarios()],
+                    'provider': args.provider,
+                    'model': args.model,
+                    'llm_kwargs': llm_kwargs
+                }
+                manifest = RunManifest.create(config, results_path=args.results_jsonl)
+                config = manifest.config
             
-        elif args.scenarios:
-            # Run specified scenarios
             results = run_multiple_evaluations(
-                scenarios=args.scenarios,
+                scenarios=config['scenarios'],
                 export=args.export,
                 visualize=args.visualize,
-                provider=args.provider,
-                model=args.model,
+                provider=config['provider'],
+                model=config.get('model'),
+                concurrency=args.concurrency,
+                workers=args.workers,
+                manifest=manifest,
                 **llm_kwargs
             )
             
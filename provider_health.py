@@ -0,0 +1,249 @@
+"""Background health probing and circuit breaking for LLM providers."""
+
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over consecutive call failures.
+
+    After failure_threshold failures in a row the breaker opens and
+    rejects calls; once reset_timeout seconds have passed, or a health
+    probe succeeds, it lets a single trial call through (half-open),
+    closing on success and reopening on failure. Only real calls close it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def would_allow(self):
+        """Whether a call could go through now, without taking the half-open trial."""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def allow(self):
+        """Return whether a call may go through now (taking the half-open trial)."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def probe_succeeded(self):
+        """A health probe passed: move an open breaker to half-open early.
+
+        A cheap probe can pass while real calls keep failing, so this never
+        closes the breaker; the half-open trial call decides.
+        """
+        with self._lock:
+            if self._current_state() == self.OPEN:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial whose call ended without a verdict (cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._current_state() == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class ProviderHealth:
+    """Latest probe outcome for one provider/model."""
+
+    __slots__ = ('healthy', 'latency', 'checked_at', 'error', 'probes', 'probe_failures')
+
+    def __init__(self):
+        self.healthy = None
+        self.latency = None
+        self.checked_at = None
+        self.error = None
+        self.probes = 0
+        self.probe_failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ProviderHealthMonitor:
+    """Probe watched providers on a background thread and cache the results.
+
+    Evaluations call available() instead of probing inline; it combines the
+    cached probe result with a per-provider CircuitBreaker. Real calls gate
+    on and report to that breaker, for example through a CircuitBreakerLLM
+    built around breaker(); a successful probe only moves an open breaker
+    to half-open.
+
+    Usage:
+        monitor = get_health_monitor()
+        monitor.watch('openai', 'gpt-4', engine.test_connection)
+        if monitor.available('openai', 'gpt-4'):
+            ...
+    """
+
+    def __init__(self, interval=60.0, failure_threshold=3, reset_timeout=30.0):
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._probes = {}
+        self._health = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, provider, model, probe):
+        """Start probing provider/model with probe(), a callable returning a bool.
+
+        The first watch of a provider probes it once inline so a status is
+        available immediately; later watches reuse the cached status.
+        """
+        key = (provider, model)
+        with self._lock:
+            first = key not in self._probes
+            if first:
+                self._probes[key] = probe
+                self._health[key] = ProviderHealth()
+                self._breaker(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='provider-health', daemon=True)
+                self._thread.start()
+        if first:
+            self.probe(provider, model)
+
+    def probe(self, provider, model) -> bool:
+        """Probe provider/model now and update its cached health."""
+        key = (provider, model)
+        with self._lock:
+            probe = self._probes[key]
+        started = time.perf_counter()
+        error = None
+        try:
+            healthy = bool(probe())
+        except Exception as e:
+            healthy, error = False, str(e)
+        latency = time.perf_counter() - started
+
+        with self._lock:
+            health = self._health[key]
+            health.healthy = healthy
+            health.latency = latency
+            health.checked_at = time.time()
+            health.error = error
+            health.probes += 1
+            if not healthy:
+                health.probe_failures += 1
+        if healthy:
+            self._breakers[key].probe_succeeded()
+        return healthy
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                keys = list(self._probes)
+            for provider, model in keys:
+                self.probe(provider, model)
+
+    def _breaker(self, key):
+        # Callers hold self._lock
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[key]
+
+    def breaker(self, provider, model) -> CircuitBreaker:
+        """Return the breaker of provider/model, creating it before the first watch."""
+        with self._lock:
+            return self._breaker((provider, model))
+
+    def available(self, provider, model) -> bool:
+        """Whether calls to provider/model should go ahead, from cached state only.
+
+        Does not take the half-open trial call, which is left to the next
+        real call.
+        """
+        key = (provider, model)
+        with self._lock:
+            health = self._health.get(key)
+        if health is None:
+            return False
+        return bool(health.healthy) and self._breakers[key].would_allow()
+
+    def record_success(self, provider, model):
+        """Report a successful real call to provider/model."""
+        breaker = self._breakers.get((provider, model))
+        if breaker is not None:
+            breaker.record_success()
+
+    def record_failure(self, provider, model):
+        """Report a failed real call to provider/model."""
+        breaker = self._breakers.get((provider, model))
+        if breaker is not None:
+            breaker.record_failure()
+
+    def status(self, provider, model) -> Optional[Dict[str, Any]]:
+        """Return the cached health and breaker state of provider/model."""
+        key = (provider, model)
+        with self._lock:
+            health = self._health.get(key)
+            if health is None:
+                return None
+            status = health.to_dict()
+        status['breaker'] = self._breakers[key].state
+        return status
+
+    def stop(self):
+        """Stop the background probing thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_shared_monitor = None
+_shared_lock = threading.Lock()
+
+
+def get_health_monitor(**kwargs) -> ProviderHealthMonitor:
+    """Return the process-wide monitor, creating it with kwargs on first use."""
+    global _shared_monitor
+    with _shared_lock:
+        if _shared_monitor is None:
+            _shared_monitor = ProviderHealthMonitor(**kwargs)
+        return _shared_monitor
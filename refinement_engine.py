@@ -1,28 +1,176 @@
 """Implementation of the refinement engine for the SRLP framework."""
 
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sqlite3
 import sys
 import os
+import queue
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from typing import Dict, Any, List, Optional
 
+from http_transport import get_shared_transport
+
 # Add parent directory to path
 sys.path.append('/Users/mohamedelhajsuliman/Desktop/Mohamed 2025 summer thesis')
 
 # Import necessary modules
 # from srlp_framework.core.refinement_engine import RefinementEngine
 
-class RefinementProcessSummary:
+class _RecordAccess:
+    """Mapping-style read access, so records stay drop-in for the old dicts."""
+    
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        if key not in self.__dataclass_fields__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        """Return the field named key, or default if there is no such field."""
+        if key not in self.__dataclass_fields__:
+            return default
+        return getattr(self, key)
+
+@dataclass(slots=True)
+class CheckRecord(_RecordAccess):
+    """Self-check result for one refinement iteration."""
+    
+    overall_score: float
+    error_count: int
+    errors: List[str]
+    constraint_violations: int
+    uncertainty_scores: Dict[str, float]
+    semantic_consistency: float
+    completeness_score: float
+    
+    def to_dict(self):
+        """Convert to dictionary representation."""
+        return {
+            'overall_score': self.overall_score,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'constraint_violations': self.constraint_violations,
+            'uncertainty_scores': self.uncertainty_scores,
+            'semantic_consistency': self.semantic_consistency,
+            'completeness_score': self.completeness_score
+        }
+
+@dataclass(slots=True)
+class FeedbackRecord(_RecordAccess):
+    """Feedback produced for one refinement iteration."""
+    
+    summary: str
+    suggestions: List[str]
+    
+    def to_dict(self):
+        """Convert to dictionary representation."""
+        return {'summary': self.summary, 'suggestions': self.suggestions}
+
+@dataclass(slots=True)
+class IterationRecord(_RecordAccess):
+    """One entry of a refinement history.
+    
+    timing holds wall-clock seconds for the 'generate', 'self_check' and
+    'feedback' stages plus the whole iteration ('total', and 'first_token'
+    when streamed); usage holds the prompt/completion token counts reported
+    by the LLM. aborted marks a streamed generation cut short by the partial
+    self-check. In beam mode, beam holds the candidates kept after this
+    iteration and pruned_candidates the ones that were scored and dropped.
+    prompt_budget is the PromptBuilder's report on the iteration's prompt.
+    Optional fields are None when unused rather than empty containers, so
+    a plain record carries no per-field allocations.
+    """
+    
+    iteration: int
+    check_result: CheckRecord
+    feedback: FeedbackRecord
+    timing: Optional[Dict[str, float]] = None
+    usage: Optional[Dict[str, int]] = None
+    beam: Optional[List[Dict[str, Any]]] = None
+    pruned_candidates: Optional[List[Dict[str, Any]]] = None
+    aborted: bool = False
+    prompt_budget: Optional[Dict[str, Any]] = None
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from its dictionary representation."""
+        return cls(
+            iteration=data['iteration'],
+            check_result=CheckRecord(**data['check_result']),
+            feedback=FeedbackRecord(**data['feedback']),
+            timing=data.get('timing') or None,
+            usage=data.get('usage') or None,
+            beam=data.get('beam'),
+            pruned_candidates=data.get('pruned_candidates'),
+            aborted=data.get('aborted', False),
+            prompt_budget=data.get('prompt_budget')
+        )
+    
+    def to_dict(self):
+        """Convert to dictionary representation."""
+        data = {
+            'iteration': self.iteration,
+            'check_result': self.check_result.to_dict(),
+            'feedback': self.feedback.to_dict(),
+            'timing': self.timing or {},
+            'usage': self.usage or {}
+        }
+        if self.beam is not None:
+            data['beam'] = self.beam
+            data['pruned_candidates'] = self.pruned_candidates or []
+        if self.aborted:
+            data['aborted'] = True
+        if self.prompt_budget:
+            data['prompt_budget'] = self.prompt_budget
+        return data
+
+@dataclass(slots=True)
+class RefinementProcessSummary(_RecordAccess):
     """Summary of a refinement process."""
     
-    def __init__(self, initial_plan, final_plan, iterations, converged, 
-                 improvement_score, total_time, refinement_history=None):
-        self.initial_plan = initial_plan
-        self.final_plan = final_plan
-        self.iterations = iterations
-        self.converged = converged
-        self.improvement_score = improvement_score
-        self.total_time = total_time
-        self.refinement_history = refinement_history or []
+    initial_plan: Dict[str, Any]
+    final_plan: Dict[str, Any]
+    iterations: int
+    converged: bool
+    improvement_score: float
+    total_time: float
+    refinement_history: List[IterationRecord] = field(default_factory=list)
+    stop_reason: Optional[str] = None
+    usage: Dict[str, Any] = field(default_factory=dict)
+    _json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        # Any field assignment makes the cached JSON stale.
+        if name != '_json':
+            object.__setattr__(self, '_json', None)
+        object.__setattr__(self, name, value)
+    
+    def __post_init__(self):
+        if self.refinement_history is None:
+            self.refinement_history = []
+        else:
+            self.refinement_history = [
+                IterationRecord.from_dict(entry) if isinstance(entry, dict) else entry
+                for entry in self.refinement_history
+            ]
+        
+    def add_iteration(self, record):
+        """Append a history entry and drop the cached JSON."""
+        self.refinement_history.append(record)
+        self.invalidate()
+    
+    def invalidate(self):
+        """Drop the cached JSON after an in-place change to a plan or the history."""
+        self._json = None
         
     def to_dict(self):
         """Convert to dictionary representation."""
@@ -33,39 +181,838 @@ class RefinementProcessSummary:
             'converged': self.converged,
             'improvement_score': self.improvement_score,
             'total_time': self.total_time,
-            'refinement_history': self.refinement_history
+            'refinement_history': [entry.to_dict() for entry in self.refinement_history],
+            'stop_reason': self.stop_reason,
+            'usage': self.usage,
+            'latency_percentiles': self.latency_percentiles()
         }
+    
+    def latency_percentiles(self, stages=('generate', 'self_check', 'feedback', 'total'),
+                            percentiles=(50, 90, 95, 99)):
+        """Per-stage iteration latency percentiles, e.g. {'generate': {'p95': ...}}."""
+        rollup = {}
+        for stage in stages:
+            values = sorted(entry.timing[stage] for entry in self.refinement_history
+                            if entry.timing and stage in entry.timing)
+            if values:
+                rollup[stage] = {f"p{pct}": _percentile(values, pct) for pct in percentiles}
+        return rollup
+    
+    def to_json(self):
+        """Return compact JSON bytes, cached until the summary is modified.
+        
+        Only the bytes are kept; the dict they are encoded from is dropped.
+        """
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), separators=(',', ':')).encode('utf-8')
+        return self._json
+
+def _percentile(sorted_values, pct):
+    """Linearly interpolated percentile of an already sorted list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+def encode_results_json(data):
+    """Encode evaluation results as compact JSON bytes.
+    
+    RefinementProcessSummary objects anywhere in data are written from their
+    cached to_json() bytes instead of being walked again.
+    """
+    summaries = []
+    # A per-call nonce keeps placeholders from matching any real string value.
+    nonce = os.urandom(8).hex()
+    
+    def default(obj):
+        if isinstance(obj, RefinementProcessSummary):
+            summaries.append(obj)
+            return f"\x00{nonce}:{len(summaries) - 1}"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    text = json.dumps(data, separators=(',', ':'), default=default)
+    if not summaries:
+        return text.encode('utf-8')
+    
+    parts = re.split(rf'"\\u0000{nonce}:(\d+)"', text)
+    chunks = []
+    for i, part in enumerate(parts):
+        chunks.append(summaries[int(part)].to_json() if i % 2 else part.encode('utf-8'))
+    return b''.join(chunks)
+
+def public_result(result):
+    """Return an evaluation result with its summary object replaced by the summary's dict.
+    
+    Evaluation pipelines carry the RefinementProcessSummary itself, so sinks
+    and exporters can reuse its cached JSON bytes; call this where a result
+    leaves them, so callers get plain JSON-serializable dicts.
+    """
+    refinement = result.get('refinement_result')
+    if isinstance(refinement, RefinementProcessSummary):
+        return {**result, 'refinement_result': refinement.to_dict()}
+    return result
+
+class RefinementTrace:
+    """Refinement of a text solution kept as per-iteration deltas.
+    
+    Each iteration only stores the text it prepends, so memory grows
+    linearly with the number of iterations; the full solution is built
+    once, on request. A digest chained over the deltas is kept alongside,
+    so hashing the trace costs the same at every iteration.
+    """
+    
+    def __init__(self, initial_solution):
+        self.initial_solution = initial_solution
+        self.deltas = []
+        self._solution = None
+        self._digest = _text_digest('', initial_solution)
+        
+    def append(self, delta):
+        """Record the text prepended by one refinement iteration."""
+        self.deltas.append(delta)
+        self._solution = None
+        self._digest = _text_digest(self._digest, delta)
+    
+    def digest(self):
+        """Hex digest of the initial solution and every delta appended so far."""
+        return self._digest
+        
+    def __len__(self):
+        return len(self.deltas)
+    
+    def __str__(self):
+        return self.solution()
+    
+    def solution(self):
+        """Build (and cache) the solution after the latest iteration."""
+        if self._solution is None:
+            self._solution = ''.join(reversed(self.deltas)) + self.initial_solution
+        return self._solution
+    
+    def iter_solutions(self):
+        """Yield the solution after each iteration, holding one copy at a time."""
+        current = self.initial_solution
+        for delta in self.deltas:
+            current = delta + current
+            yield current
+
+def _text_digest(previous, text):
+    """Chain the whitespace-collapsed text onto a previous hex digest."""
+    text = ' '.join(str(text).split())
+    return hashlib.sha256(f"{previous}\x00{text}".encode('utf-8')).hexdigest()
+
+def content_hash(solution, problem=None):
+    """Stable hash of a normalized solution and the problem it answers.
+    
+    Dict/list plans are hashed by their key-sorted JSON; text solutions by
+    their whitespace-collapsed form, so formatting-only differences hit the
+    same entry. A RefinementTrace is hashed by its running digest instead
+    of its full text.
+    """
+    if isinstance(solution, RefinementTrace):
+        solution_text = solution.digest()
+    elif isinstance(solution, (dict, list)):
+        solution_text = json.dumps(solution, sort_keys=True, separators=(',', ':'), default=str)
+    else:
+        solution_text = ' '.join(str(solution).split())
+    problem_text = json.dumps(problem, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{problem_text}\x00{solution_text}".encode('utf-8')).hexdigest()
+
+class SQLiteStore:
+    """Persistent key/value store backed by one SQLite table."""
+    
+    def __init__(self, path, table='cache'):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+    
+    def get(self, key):
+        """Return (value, created timestamp) for key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+    
+    def set(self, key, value):
+        """Store a JSON-serializable value under key."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+    
+    def delete(self, key):
+        """Remove key if present."""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class QualityCache:
+    """Memoized quality scores keyed by content_hash.
+    
+    Scores live in a bounded in-memory LRU and, when path is given, in an
+    SQLite file shared across runs. Any object with the same get/put
+    interface can be passed to RefinementEngine instead.
+    """
+    
+    def __init__(self, max_size=1024, path=None):
+        self.max_size = max_size
+        self.store = SQLiteStore(path, table='quality_scores') if path else None
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached score for key, or None on a miss."""
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+        
+        stored = self.store.get(key) if self.store is not None else None
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, stored[0])
+            return stored[0]
+    
+    def put(self, key, score):
+        """Cache score under key in memory and, if configured, on disk."""
+        with self._lock:
+            self._remember(key, score)
+        if self.store is not None:
+            self.store.set(key, score)
+    
+    def _remember(self, key, score):
+        self._lru[key] = score
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+    
+    def stats(self):
+        """Return hit/miss counters for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._lru),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+class RefinementCheckpoint:
+    """Append-only JSONL log of the finished iterations of one refinement.
+    
+    Each line holds one IterationRecord and is flushed to disk before the
+    next iteration starts, so a killed run loses at most the iteration in
+    progress. In beam mode a line also carries the content of the beam the
+    iteration kept, which the summary's records leave out, so a resumed run
+    builds the same prompts as an uninterrupted one.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        
+    def load(self):
+        """Return the IterationRecords already recorded, oldest first, and the
+        beam carried out of the last one."""
+        if not os.path.exists(self.path):
+            return [], []
+        
+        records = []
+        beam = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                    records.append(IterationRecord.from_dict(data))
+                except (ValueError, KeyError, TypeError):
+                    # A torn final line from a crash mid-write; later lines cannot exist.
+                    break
+                beam = data.get('beam_state', [])
+        return records, beam
+    
+    def append(self, record, beam=None):
+        """Durably append one finished iteration and the beam it kept."""
+        data = record.to_dict()
+        if beam:
+            data['beam_state'] = beam
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(data, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def remove(self):
+        """Delete the log once its refinement has been summarized."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+# Phrases that mark a generation as a refusal or off-task, so a streamed
+# generation containing one is abandoned before it completes.
+DEFAULT_ABORT_MARKERS = ("I cannot", "I can't help", "I'm sorry", "As an AI")
+
+class PromptBuilder:
+    """Builds refinement prompts from the history within a token budget.
+    
+    The goal/iteration header is always included. Feedback from the last
+    verbatim_iterations iterations goes in verbatim (summary, suggestions
+    and open errors); older iterations are compacted to one line each.
+    While the prompt is over token_budget, compacted lines are dropped
+    oldest first, then the oldest verbatim iteration is compacted.
+    """
+    
+    def __init__(self, token_budget=512, verbatim_iterations=2, summary_chars=80):
+        self.token_budget = token_budget
+        self.verbatim_iterations = verbatim_iterations
+        self.summary_chars = summary_chars
+    
+    def build(self, problem, iteration, history):
+        """Return (prompt, report) for an iteration given the records before it."""
+        header = (f"Refine the plan for: {problem.get('goal', 'No goal specified')} "
+                  f"(iteration {iteration + 1})")
+        history = list(history)
+        keep = min(self.verbatim_iterations, len(history))
+        verbatim = history[len(history) - keep:]
+        compacted = [self._compact(record) for record in history[:len(history) - keep]]
+        dropped = 0
+        
+        while True:
+            prompt = self._render(header, compacted, verbatim)
+            tokens = estimate_tokens(prompt)
+            if tokens <= self.token_budget:
+                break
+            if compacted:
+                compacted.pop(0)
+                dropped += 1
+            elif verbatim:
+                compacted.append(self._compact(verbatim.pop(0)))
+            else:
+                break
+        
+        return prompt, {
+            'budget': self.token_budget,
+            'prompt_tokens': tokens,
+            'verbatim': len(verbatim),
+            'compacted': len(compacted),
+            'dropped': dropped,
+            'over_budget': tokens > self.token_budget
+        }
+    
+    def _compact(self, record):
+        summary = record.feedback.summary
+        if len(summary) > self.summary_chars:
+            summary = summary[:self.summary_chars - 3].rstrip() + "..."
+        return (f"- Iteration {record.iteration}: score {record.check_result.overall_score:.2f}, "
+                f"{record.check_result.error_count} errors; {summary}")
+    
+    def _verbatim(self, record):
+        lines = [f"Feedback from iteration {record.iteration} "
+                 f"(score {record.check_result.overall_score:.2f}):",
+                 record.feedback.summary]
+        lines.extend(f"- {suggestion}" for suggestion in record.feedback.suggestions)
+        if record.check_result.errors:
+            lines.append(f"Open errors: {', '.join(record.check_result.errors)}")
+        return '\n'.join(lines)
+    
+    def _render(self, header, compacted, verbatim):
+        sections = [header]
+        if compacted:
+            sections.append("Earlier feedback (summarized):\n" + '\n'.join(compacted))
+        sections.extend(self._verbatim(record) for record in verbatim)
+        return '\n\n'.join(sections)
 
 class RefinementEngine:
     """Mock refinement engine for demonstration purposes."""
     
-    def __init__(self, llm=None, max_iterations=5, quality_threshold=0.8):
+    def __init__(self, llm=None, max_iterations=5, quality_threshold=0.8,
+                 convergence_epsilon=0.01, quality_cache=None, checkpoint_dir=None,
+                 beam_candidates=1, beam_width=1, streaming=False,
+                 stream_check_interval=8, abort_markers=DEFAULT_ABORT_MARKERS,
+                 prompt_builder=None):
         self.llm = llm
         self.max_iterations = max_iterations
         self.quality_threshold = quality_threshold
+        self.convergence_epsilon = convergence_epsilon
+        self.quality_cache = quality_cache
+        self.checkpoint_dir = checkpoint_dir
+        self.beam_candidates = beam_candidates
+        self.beam_width = beam_width
+        self.streaming = streaming
+        self.stream_check_interval = stream_check_interval
+        self.abort_markers = abort_markers
+        # Optional PromptBuilder feeding budgeted history into each prompt.
+        self.prompt_builder = prompt_builder
+        # Checkpoint files claimed by refinements in progress
+        self._active_checkpoints = set()
+        self._checkpoint_lock = threading.Lock()
         
     def refine(self, initial_solution, problem_description):
-        """Refine the initial solution iteratively."""
-        current_solution = initial_solution
+        """Refine the initial solution until it converges or max_iterations is hit."""
+        return self.refine_trace(initial_solution, problem_description).solution()
+    
+    def refine_trace(self, initial_solution, problem_description):
+        """Refine the initial solution, returning a RefinementTrace of the deltas."""
+        trace = RefinementTrace(initial_solution)
+        scores = []
         
         for iteration in range(self.max_iterations):
             # Mock refinement logic
-            refined_solution = f"Refined solution (iteration {iteration + 1}): {current_solution}"
-            current_solution = refined_solution
+            trace.append(f"Refined solution (iteration {iteration + 1}): ")
+            
+            scores.append(self.evaluate_quality(trace, problem_description))
+            if self._stop_reason(scores) is not None:
+                break
             
-        return current_solution
+        return trace
+    
+    def _stop_reason(self, scores):
+        """Return why refinement should stop after the latest score, or None.
+        
+        Stops with 'quality_threshold' once the latest score reaches
+        quality_threshold, with 'plateau' when it improved on the previous
+        iteration by less than convergence_epsilon, or with 'regressed' when
+        it fell below the previous one. Only the first two count as converged.
+        """
+        if not scores:
+            return None
+        if scores[-1] >= self.quality_threshold:
+            return 'quality_threshold'
+        if len(scores) > 1:
+            delta = scores[-1] - scores[-2]
+            if delta < 0:
+                return 'regressed'
+            if delta < self.convergence_epsilon:
+                return 'plateau'
+        return None
+        
+    def evaluate_quality(self, solution, problem=None):
+        """Evaluate the quality of a solution (a string, plan dict or RefinementTrace).
         
-    def evaluate_quality(self, solution):
-        """Evaluate the quality of a solution."""
+        With a quality_cache configured, identical solutions for the same
+        problem are scored once and then served from the cache.
+        """
+        if self.quality_cache is None:
+            return self._score_quality(solution, problem)
+        
+        key = content_hash(solution, problem)
+        score = self.quality_cache.get(key)
+        if score is None:
+            score = self._score_quality(solution, problem)
+            self.quality_cache.put(key, score)
+        return score
+    
+    def _score_quality(self, solution, problem):
+        """Score a solution without consulting the cache."""
         # Mock quality evaluation
         return 0.85  # Mock quality score
         
     def refine_plan(self, problem):
-        """Refine a plan based on the given problem."""
-        import time
+        """Refine a plan based on the given problem.
+        
+        With checkpoint_dir set, every finished iteration is appended to a
+        checkpoint file keyed by the problem and the engine/LLM configuration,
+        and a rerun after a crash resumes after the last one recorded,
+        without repeating its LLM calls. The file is removed once the
+        refinement is summarized.
+        """
+        initial_plan = self._initial_plan(problem)
+        
+        checkpoint = self._checkpoint_for(problem)
+        try:
+            restored, beam = checkpoint.load() if checkpoint is not None else ([], [])
+            
+            refinement_history = []
+            stop_reason = None
+            for i in range(self.max_iterations):
+                if i < len(restored):
+                    refinement_history.append(restored[i])
+                else:
+                    started = time.perf_counter()
+                    prompt, prompt_budget = self._refinement_prompt(problem, i, refinement_history)
+                    responses = self._generate_step(prompt, beam)
+                    record, beam = self._finish_iteration(problem, i, responses, started)
+                    record.prompt_budget = prompt_budget
+                    if checkpoint is not None:
+                        checkpoint.append(record, beam)
+                    refinement_history.append(record)
+                stop_reason = self._stop_reason(
+                    [r.check_result.overall_score for r in refinement_history])
+                if stop_reason is not None:
+                    break
+            
+            summary = self._summarize(problem, initial_plan, refinement_history, stop_reason)
+            if checkpoint is not None:
+                checkpoint.remove()
+            return summary
+        finally:
+            self._release_checkpoint(checkpoint)
+    
+    async def arefine_plan(self, problem):
+        """Async variant of refine_plan that awaits the LLM between iterations.
+        
+        Many refinements can share one event loop, so a batch is bounded by
+        its slowest LLM round trip instead of the sum of all of them.
+        """
+        initial_plan = self._initial_plan(problem)
+        
+        checkpoint = self._checkpoint_for(problem)
+        try:
+            # Checkpoint file I/O (including the fsync per iteration) runs in a
+            # worker thread so it never stalls the other refinements on the loop
+            if checkpoint is not None:
+                restored, beam = await asyncio.to_thread(checkpoint.load)
+            else:
+                restored, beam = [], []
+            
+            refinement_history = []
+            stop_reason = None
+            for i in range(self.max_iterations):
+                if i < len(restored):
+                    refinement_history.append(restored[i])
+                else:
+                    started = time.perf_counter()
+                    prompt, prompt_budget = self._refinement_prompt(problem, i, refinement_history)
+                    responses = await self._agenerate_step(prompt, beam)
+                    record, beam = self._finish_iteration(problem, i, responses, started)
+                    record.prompt_budget = prompt_budget
+                    if checkpoint is not None:
+                        await asyncio.to_thread(checkpoint.append, record, beam)
+                    refinement_history.append(record)
+                stop_reason = self._stop_reason(
+                    [r.check_result.overall_score for r in refinement_history])
+                if stop_reason is not None:
+                    break
+            
+            summary = self._summarize(problem, initial_plan, refinement_history, stop_reason)
+            if checkpoint is not None:
+                await asyncio.to_thread(checkpoint.remove)
+            return summary
+        finally:
+            self._release_checkpoint(checkpoint)
+    
+    def _beam_prompts(self, base, beam):
+        """Prompts for the beam_candidates candidates of one iteration.
+        
+        Candidates are spread round-robin over the surviving beam, each one
+        refining its parent candidate's content.
+        """
+        prompts = []
+        for k in range(self.beam_candidates):
+            prompt = f"{base} [candidate {k + 1}]"
+            if beam:
+                prompt += f"\nPrevious candidate:\n{beam[k % len(beam)]['content']}"
+            prompts.append(prompt)
+        return prompts
+    
+    def _generate_step(self, prompt, beam):
+        """Call the LLM for one iteration, returning its responses (K in beam mode)."""
+        if self.llm is None:
+            return []
+        if self.beam_candidates > 1:
+            prompts = self._beam_prompts(prompt, beam)
+            with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+                return list(pool.map(self.llm.generate, prompts))
+        if self.streaming and hasattr(self.llm, 'stream'):
+            return [self._consume_stream(prompt, self.llm.stream(prompt))]
+        return [self.llm.generate(prompt)]
+    
+    async def _agenerate_step(self, prompt, beam):
+        """Async counterpart of _generate_step."""
+        if self.llm is None:
+            return []
+        if self.beam_candidates > 1:
+            prompts = self._beam_prompts(prompt, beam)
+            return list(await asyncio.gather(*(self._agenerate(candidate) for candidate in prompts)))
+        if self.streaming and hasattr(self.llm, 'astream'):
+            return [await self._aconsume_stream(prompt, self.llm.astream(prompt))]
+        return [await self._agenerate(prompt)]
+    
+    def _consume_stream(self, prompt, chunks):
+        """Collect a streamed generation, aborting it once the partial plan fails its check."""
+        started = time.perf_counter()
+        parts = []
+        first_token = None
+        aborted = False
+        try:
+            for count, chunk in enumerate(chunks, 1):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(chunk)
+                if count % self.stream_check_interval == 0 and not self._partial_check(''.join(parts)):
+                    aborted = True
+                    break
+        finally:
+            chunks.close()
+        return self._streamed_response(prompt, parts, started, first_token, aborted)
+    
+    async def _aconsume_stream(self, prompt, chunks):
+        """Async counterpart of _consume_stream."""
+        started = time.perf_counter()
+        parts = []
+        first_token = None
+        aborted = False
+        try:
+            count = 0
+            async for chunk in chunks:
+                count += 1
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(chunk)
+                if count % self.stream_check_interval == 0 and not self._partial_check(''.join(parts)):
+                    aborted = True
+                    break
+        finally:
+            await chunks.aclose()
+        return self._streamed_response(prompt, parts, started, first_token, aborted)
+    
+    def _streamed_response(self, prompt, parts, started, first_token, aborted):
+        """Wrap collected stream chunks into an LLMResponse."""
+        content = ''.join(parts)
+        # The final partial check also covers streams shorter than one interval.
+        aborted = aborted or not self._partial_check(content)
+        response = LLMResponse(content, time.perf_counter() - started,
+                               prompt_tokens=estimate_tokens(prompt),
+                               completion_tokens=estimate_tokens(content))
+        response.first_token_time = first_token
+        response.aborted = aborted
+        return response
+    
+    def _partial_check(self, partial_text):
+        """Cheap self-check of a partial generation; False means abandon it."""
+        return not any(marker in partial_text for marker in self.abort_markers)
+    
+    def _finish_iteration(self, problem, iteration, responses, started):
+        """Self-check and give feedback on an iteration's responses.
+        
+        Returns the timed IterationRecord and the beam carried into the
+        next iteration.
+        """
+        generated = time.perf_counter()
+        
+        check_result = self._self_check(iteration)
+        beam = []
+        record = IterationRecord(iteration=iteration + 1, check_result=check_result,
+                                 feedback=None)
+        if self.beam_candidates > 1 and responses:
+            beam = self._select_beam(problem, record, [r.content for r in responses])
+        checked = time.perf_counter()
+        
+        record.feedback = self._feedback(iteration)
+        finished = time.perf_counter()
+        
+        record.timing = {
+            'generate': generated - started,
+            'self_check': checked - generated,
+            'feedback': finished - checked,
+            'total': finished - started
+        }
+        first_tokens = [r.first_token_time for r in responses
+                        if getattr(r, 'first_token_time', None) is not None]
+        if first_tokens:
+            record.timing['first_token'] = min(first_tokens)
+        record.aborted = any(getattr(r, 'aborted', False) for r in responses)
+        record.usage = {
+            'prompt_tokens': sum(getattr(r, 'prompt_tokens', 0) for r in responses),
+            'completion_tokens': sum(getattr(r, 'completion_tokens', 0) for r in responses)
+        }
+        return record, beam
+    
+    def _select_beam(self, problem, record, contents):
+        """Score candidates, keep the best beam_width and record the rest.
+        
+        The iteration's overall_score becomes the best candidate's score when
+        that is higher, so a strong beam can converge in fewer iterations.
+        """
+        scored = sorted(
+            ({'candidate': k + 1, 'score': self.evaluate_quality(content, problem),
+              'content': content} for k, content in enumerate(contents)),
+            key=lambda candidate: candidate['score'], reverse=True
+        )
+        beam = scored[:max(1, self.beam_width)]
+        record.beam = [{'candidate': c['candidate'], 'score': c['score']} for c in beam]
+        record.pruned_candidates = [
+            {'candidate': c['candidate'], 'score': c['score']} for c in scored[len(beam):]
+        ] or None
+        record.check_result.overall_score = max(record.check_result.overall_score,
+                                                beam[0]['score'])
+        return beam
+    
+    def _checkpoint_config(self):
+        """Engine and LLM settings that shape a refinement's iterations."""
+        builder = self.prompt_builder
+        return {
+            'provider': getattr(self.llm, 'provider', None),
+            'model': getattr(self.llm, 'model_name', None),
+            'temperature': getattr(self.llm, 'temperature', None),
+            'max_tokens': getattr(self.llm, 'max_tokens', None),
+            'max_iterations': self.max_iterations,
+            'quality_threshold': self.quality_threshold,
+            'convergence_epsilon': self.convergence_epsilon,
+            'beam_candidates': self.beam_candidates,
+            'beam_width': self.beam_width,
+            'streaming': self.streaming,
+            'prompt_builder': None if builder is None else [
+                builder.token_budget, builder.verbatim_iterations, builder.summary_chars
+            ]
+        }
+    
+    def _checkpoint_for(self, problem):
+        """Claim the checkpoint for a problem under this engine's configuration.
+        
+        Returns None when checkpointing is off, or when another refinement
+        of the same problem and configuration already holds the file; that
+        one runs without checkpointing rather than interleaving lines.
+        """
+        if self.checkpoint_dir is None:
+            return None
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        key = content_hash(self._checkpoint_config(), problem)
+        path = os.path.join(self.checkpoint_dir, f"{key}.jsonl")
+        with self._checkpoint_lock:
+            if path in self._active_checkpoints:
+                return None
+            self._active_checkpoints.add(path)
+        return RefinementCheckpoint(path)
+    
+    def _release_checkpoint(self, checkpoint):
+        if checkpoint is not None:
+            with self._checkpoint_lock:
+                self._active_checkpoints.discard(checkpoint.path)
+    
+    def refine_plan_many(self, problems, concurrency=4, ordered=False,
+                         return_exceptions=False):
+        """Refine many problems concurrently, yielding summaries as they finish.
+        
+        The whole batch shares this engine and its LLM client. At most
+        concurrency refinements are in flight, and problems is consumed
+        lazily, so it may be a generator over an arbitrarily large sweep.
+        When ordered, at most 2 * concurrency problems are started but not
+        yet yielded, so a straggler pauses new work instead of letting the
+        rest of the input pile up behind it.
+        
+        Args:
+            problems: Iterable of problem dicts
+            concurrency: Maximum number of refinements in flight
+            ordered: Yield summaries in input order instead of completion order
+            return_exceptions: Yield a failed refinement's exception in its
+                place instead of raising it
+        """
+        problems = iter(problems)
+        concurrency = max(1, concurrency)
+        window = 2 * concurrency
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        pending = {}
+        finished = {}
+        submitted = 0
+        next_to_yield = 0
+        exhausted = False
+        
+        def fill():
+            nonlocal submitted, exhausted
+            while not exhausted and len(pending) < concurrency:
+                if ordered and submitted - next_to_yield >= window:
+                    return
+                problem = next(problems, None)
+                if problem is None:
+                    exhausted = True
+                    return
+                pending[pool.submit(self.refine_plan, problem)] = submitted
+                submitted += 1
+        
+        try:
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    fill()
+                    
+                    error = future.exception()
+                    if error is not None and not return_exceptions:
+                        raise error
+                    outcome = error if error is not None else future.result()
+                    
+                    if not ordered:
+                        yield outcome
+                        continue
+                    finished[index] = outcome
+                    while next_to_yield in finished:
+                        yield finished.pop(next_to_yield)
+                        next_to_yield += 1
+                    fill()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    async def arefine_plan_many(self, problems, concurrency=4):
+        """Async counterpart of refine_plan_many, yielding in completion order."""
+        problems = iter(problems)
+        pending = set()
         
-        # Mock refinement process
-        initial_plan = {
+        def submit_next():
+            problem = next(problems, None)
+            if problem is not None:
+                pending.add(asyncio.ensure_future(self.arefine_plan(problem)))
+        
+        try:
+            for _ in range(max(1, concurrency)):
+                submit_next()
+            
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    submit_next()
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def get_provider_info(self):
+        """Return provider information for the engine's LLM."""
+        return self.llm.get_provider_info()
+    
+    def test_connection(self):
+        """Check that the engine's LLM is reachable."""
+        return self.llm is not None and self.llm.test_connection()
+    
+    async def _agenerate(self, prompt):
+        """Await the LLM, running a sync-only generate in a worker thread."""
+        agenerate = getattr(self.llm, 'agenerate', None)
+        if agenerate is not None:
+            return await agenerate(prompt)
+        return await asyncio.to_thread(self.llm.generate, prompt)
+    
+    def _refinement_prompt(self, problem, iteration, history=()):
+        """Build the prompt for one refinement iteration and its budget report.
+        
+        Without a prompt_builder the prompt is just the goal and iteration
+        and the report is None.
+        """
+        if self.prompt_builder is not None:
+            return self.prompt_builder.build(problem, iteration, history)
+        return (f"Refine the plan for: {problem.get('goal', 'No goal specified')} "
+                f"(iteration {iteration + 1})"), None
+    
+    def _initial_plan(self, problem):
+        """Build the mock initial plan for a problem."""
+        return {
             "type": problem.get("type", "general"),
             "goal": problem.get("goal", "No goal specified"),
             "steps": [
@@ -76,7 +1023,28 @@ class RefinementEngine:
             "estimated_cost": "$1000",
             "duration": "3 days"
         }
-        
+    
+    def _self_check(self, i):
+        """Build the mock self-check result for iteration i."""
+        return CheckRecord(
+            overall_score=min(1.0, 0.6 + (i * 0.1)),
+            error_count=max(0, 3 - i),
+            errors=[f"Error {j+1}" for j in range(max(0, 3 - i))],
+            constraint_violations=max(0, 2 - i),
+            uncertainty_scores={"planning": min(1.0, 0.7 + (i * 0.1))},
+            semantic_consistency=min(1.0, 0.8 + (i * 0.05)),
+            completeness_score=min(1.0, 0.7 + (i * 0.1))
+        )
+    
+    def _feedback(self, i):
+        """Build the mock feedback for iteration i."""
+        return FeedbackRecord(
+            summary=f"Iteration {i+1}: Improved planning details and constraint handling",
+            suggestions=[f"Suggestion {j+1} for iteration {i+1}" for j in range(2)]
+        )
+    
+    def _summarize(self, problem, initial_plan, refinement_history, stop_reason=None):
+        """Assemble the RefinementProcessSummary for a finished refinement."""
         final_plan = {
             "type": problem.get("type", "general"),
             "goal": problem.get("goal", "No goal specified"),
@@ -92,52 +1060,254 @@ class RefinementEngine:
             "optimizations": ["Cost reduction", "Time efficiency", "Quality improvement"]
         }
         
-        # Mock refinement history
-        refinement_history = []
-        for i in range(min(3, self.max_iterations)):
-            iteration_data = {
-                "iteration": i + 1,
-                "check_result": {
-                    "overall_score": 0.6 + (i * 0.1),
-                    "error_count": max(0, 3 - i),
-                    "errors": [f"Error {j+1}" for j in range(max(0, 3 - i))],
-                    "constraint_violations": max(0, 2 - i),
-                    "uncertainty_scores": {"planning": 0.7 + (i * 0.1)},
-                    "semantic_consistency": 0.8 + (i * 0.05),
-                    "completeness_score": 0.7 + (i * 0.1)
-                },
-                "feedback": {
-                    "summary": f"Iteration {i+1}: Improved planning details and constraint handling",
-                    "suggestions": [f"Suggestion {j+1} for iteration {i+1}" for j in range(2)]
-                }
-            }
-            refinement_history.append(iteration_data)
+        prompt_tokens = sum(r.usage.get('prompt_tokens', 0) for r in refinement_history if r.usage)
+        completion_tokens = sum(r.usage.get('completion_tokens', 0)
+                                for r in refinement_history if r.usage)
+        prompt_price, completion_price = getattr(self.llm, 'pricing', (0.0, 0.0))
         
-        # Create result object
-        result = RefinementProcessSummary(
+        return RefinementProcessSummary(
             initial_plan=initial_plan,
             final_plan=final_plan,
             iterations=len(refinement_history),
-            converged=True,
+            converged=stop_reason in ('quality_threshold', 'plateau'),
             improvement_score=0.25,
-            total_time=2.5,
-            refinement_history=refinement_history
+            # Sum of per-iteration wall time, so a checkpoint-resumed run reports
+            # the same total as an uninterrupted one.
+            total_time=sum(r.timing.get('total', 0.0) for r in refinement_history if r.timing),
+            refinement_history=refinement_history,
+            stop_reason=stop_reason or 'max_iterations',
+            usage={
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'cost_usd': (prompt_tokens * prompt_price
+                             + completion_tokens * completion_price) / 1000
+            }
         )
-        
-        return result
 
 # Mock implementation of LLMFactory and other required classes
+
+# USD per 1K (prompt, completion) tokens, used for the cost rollup in
+# RefinementProcessSummary.usage. Override per LLM with the pricing kwarg.
+PROVIDER_PRICING = {
+    'openai': (0.03, 0.06),
+    'claude': (0.015, 0.075),
+    'llama': (0.0, 0.0),
+    'huggingface': (0.0, 0.0),
+    'mock': (0.0, 0.0)
+}
+
+# Provider characteristics from real-world observations, shared with
+# simulate_multi_provider_results.py. speed_base/speed_variance (seconds)
+# drive MockLatencyModel; the quality and convergence figures are only
+# used by the simulation.
+PROVIDER_PROFILES = {
+    'openai': {
+        'models': ['gpt-4', 'gpt-3.5-turbo'],
+        'quality_base': 0.85,
+        'quality_variance': 0.08,
+        'speed_base': 2.5,
+        'speed_variance': 0.8,
+        'improvement_rate': 0.75,
+        'convergence_rate': 0.60
+    },
+    'claude': {
+        'models': ['claude-3-opus', 'claude-3-sonnet'],
+        'quality_base': 0.82,
+        'quality_variance': 0.06,
+        'speed_base': 2.8,
+        'speed_variance': 0.7,
+        'improvement_rate': 0.70,
+        'convergence_rate': 0.55
+    },
+    'llama': {
+        'models': ['llama-2-70b', 'llama-2-13b'],
+        'quality_base': 0.75,
+        'quality_variance': 0.10,
+        'speed_base': 1.2,
+        'speed_variance': 0.4,
+        'improvement_rate': 0.60,
+        'convergence_rate': 0.40
+    },
+    'huggingface': {
+        'models': ['mistral-7b', 'codellama-34b'],
+        'quality_base': 0.68,
+        'quality_variance': 0.12,
+        'speed_base': 0.8,
+        'speed_variance': 0.3,
+        'improvement_rate': 0.50,
+        'convergence_rate': 0.30
+    },
+    'mock': {
+        'models': ['mock-model'],
+        'quality_base': 0.55,
+        'quality_variance': 0.05,
+        'speed_base': 0.1,
+        'speed_variance': 0.02,
+        'improvement_rate': 0.40,
+        'convergence_rate': 0.00
+    }
+}
+
+def estimate_tokens(text):
+    """Rough token count for text (about four characters per token)."""
+    return max(1, round(len(text) / 4)) if text else 0
+
+class LLMResponse:
+    """Completion returned by an LLM provider."""
+    
+    def __init__(self, content, response_time, prompt_tokens=0, completion_tokens=0):
+        self.content = content
+        self.response_time = response_time
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.first_token_time = None
+        self.aborted = False
+
+class MockLatencyModel:
+    """Seeded latency, failure and throttling model for MockLLM.
+    
+    Each call's latency is drawn from a normal distribution with the
+    profile's speed_base mean and speed_variance spread (floored at
+    min_latency), then multiplied by scale to compress wall time in load
+    tests. error_rate of calls fail with a RuntimeError after their
+    latency; throttle_rate are rejected quickly with a RateLimitError.
+    
+    Draws are seeded from (seed, prompt, how many times that prompt has
+    been seen), not from one shared stream, so a run is reproducible no
+    matter how concurrent calls interleave.
+    """
+    
+    def __init__(self, speed_base=0.1, speed_variance=0.02, seed=0, scale=1.0,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1.0, min_latency=0.01):
+        self.speed_base = speed_base
+        self.speed_variance = speed_variance
+        self.seed = seed
+        self.scale = scale
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.min_latency = min_latency
+        self._seen = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_provider(cls, provider, **kwargs):
+        """Build a model from PROVIDER_PROFILES (unknown providers get the mock profile)."""
+        profile = PROVIDER_PROFILES.get(provider, PROVIDER_PROFILES['mock'])
+        return cls(profile['speed_base'], profile['speed_variance'], **kwargs)
+    
+    def sample(self, prompt):
+        """Return (latency_seconds, error) for the next call with prompt; error may be None."""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            occurrence = self._seen.get(prompt_hash, 0)
+            self._seen[prompt_hash] = occurrence + 1
+        rng = random.Random(f"{self.seed}:{prompt_hash}:{occurrence}")
+        
+        latency = max(self.min_latency, rng.gauss(self.speed_base, self.speed_variance)) * self.scale
+        roll = rng.random()
+        if roll < self.throttle_rate:
+            return latency * 0.1, RateLimitError("Injected mock throttling (HTTP 429)",
+                                                 retry_after=self.retry_after * self.scale)
+        if roll < self.throttle_rate + self.error_rate:
+            return latency, RuntimeError("Injected mock provider error")
+        return latency, None
+
 class MockLLM:
-    def __init__(self, provider="mock", model_name="mock-model"):
+    def __init__(self, provider="mock", model_name="mock-model", pricing=None,
+                 token_delay=0.0, temperature=0.7, forward_latency=0.0, latency_model=None):
         self.provider = provider
         self.model_name = model_name
+        self.temperature = temperature
+        self.pricing = pricing or PROVIDER_PRICING.get(provider, (0.0, 0.0))
+        self.token_delay = token_delay
+        # Seconds per simulated forward pass, paid once per generate or batch.
+        # Passes run one at a time, like a single local model on CPU.
+        self.forward_latency = forward_latency
+        self._forward_lock = threading.Lock()
+        # Optional MockLatencyModel: real per-call latency, errors and throttling.
+        self.latency_model = latency_model
         
+    def _completion(self, prompt):
+        return "This is a mock response."
+    
+    def _response(self, prompt, response_time):
+        content = self._completion(prompt)
+        return LLMResponse(content, response_time, prompt_tokens=estimate_tokens(prompt),
+                           completion_tokens=estimate_tokens(content))
+    
+    def _forward_pass(self):
+        if self.forward_latency:
+            with self._forward_lock:
+                time.sleep(self.forward_latency)
+    
+    def _simulated_latency(self, prompt):
+        """Draw the call's latency from the latency model, raising injected errors after it."""
+        if self.latency_model is None:
+            return 0.0, None
+        return self.latency_model.sample(prompt)
+    
     def generate(self, prompt, max_tokens=500):
-        class Response:
-            def __init__(self):
-                self.content = "This is a mock response."
-                self.response_time = 0.1
-        return Response()
+        latency, error = self._simulated_latency(prompt)
+        if latency:
+            time.sleep(latency)
+        if error is not None:
+            raise error
+        self._forward_pass()
+        return self._response(prompt, latency or self.forward_latency or 0.1)
+    
+    def generate_batch(self, prompts, max_tokens=500):
+        """Complete several prompts in one simulated forward pass."""
+        latency, error = self._simulated_latency('\n'.join(prompts))
+        if latency:
+            time.sleep(latency)
+        if error is not None:
+            raise error
+        self._forward_pass()
+        return [self._response(prompt, latency or self.forward_latency or 0.1) for prompt in prompts]
+    
+    async def agenerate(self, prompt, max_tokens=500):
+        """Async counterpart of generate for event-loop driven callers."""
+        latency, error = self._simulated_latency(prompt)
+        if latency:
+            await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        if self.forward_latency:
+            return await asyncio.to_thread(self._response_after_pass, prompt)
+        return self._response(prompt, latency or 0.1)
+    
+    def _response_after_pass(self, prompt):
+        self._forward_pass()
+        return self._response(prompt, self.forward_latency)
+    
+    def stream(self, prompt, max_tokens=500):
+        """Yield the completion word by word, token_delay seconds apart.
+        
+        With a latency model, its latency is spent before the first chunk.
+        """
+        latency, error = self._simulated_latency(prompt)
+        if latency:
+            time.sleep(latency)
+        if error is not None:
+            raise error
+        for i, chunk in enumerate(re.findall(r'\S+\s*', self._completion(prompt))):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield chunk
+    
+    async def astream(self, prompt, max_tokens=500):
+        """Async counterpart of stream."""
+        latency, error = self._simulated_latency(prompt)
+        if latency:
+            await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        for i, chunk in enumerate(re.findall(r'\S+\s*', self._completion(prompt))):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield chunk
     
     def get_provider_info(self):
         return {
@@ -149,14 +1319,1263 @@ class MockLLM:
     def test_connection(self):
         return True
 
+class HTTPLLM:
+    """LLM served over an OpenAI-style completions HTTP endpoint.
+    
+    Requests go through a PooledTransport; LLMFactory hands every HTTPLLM
+    the process-wide one, so keep-alive connections are reused across
+    engines, scenarios and fallbacks instead of being reopened per call.
+    """
+    
+    def __init__(self, provider="http", model_name=None, base_url="http://127.0.0.1:8000",
+                 api_key=None, temperature=0.7, max_tokens=1000, transport=None, pricing=None):
+        self.provider = provider
+        self.model_name = model_name
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.transport = transport or get_shared_transport()
+        self.pricing = pricing or PROVIDER_PRICING.get(provider, (0.0, 0.0))
+        
+    def _headers(self):
+        return {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+    
+    def generate(self, prompt, max_tokens=None):
+        started = time.perf_counter()
+        response = self.transport.request('POST', f"{self.base_url}/v1/completions", body={
+            'model': self.model_name,
+            'prompt': prompt,
+            'max_tokens': max_tokens or self.max_tokens,
+            'temperature': self.temperature
+        }, headers=self._headers())
+        if response.status in (429, 503):
+            retry_after = response.headers.get('Retry-After')
+            raise RateLimitError(f"{self.provider} throttled the request (HTTP {response.status})",
+                                 retry_after=float(retry_after) if retry_after else None)
+        if response.status != 200:
+            raise RuntimeError(f"{self.provider} returned HTTP {response.status}")
+        
+        data = response.json()
+        usage = data.get('usage', {})
+        content = data['choices'][0]['text']
+        return LLMResponse(content, time.perf_counter() - started,
+                           prompt_tokens=usage.get('prompt_tokens', estimate_tokens(prompt)),
+                           completion_tokens=usage.get('completion_tokens', estimate_tokens(content)))
+    
+    async def agenerate(self, prompt, max_tokens=None):
+        """Async counterpart of generate, run on a worker thread."""
+        return await asyncio.to_thread(self.generate, prompt, max_tokens)
+    
+    def stream(self, prompt, max_tokens=None):
+        """Yield the completion; the completions endpoint returns it as one chunk."""
+        yield self.generate(prompt, max_tokens).content
+    
+    async def astream(self, prompt, max_tokens=None):
+        """Async counterpart of stream."""
+        yield (await self.agenerate(prompt, max_tokens)).content
+    
+    def get_provider_info(self):
+        return {
+            "provider": self.provider,
+            "model": self.model_name,
+            "base_url": self.base_url,
+            "description": "HTTP completions provider"
+        }
+    
+    def test_connection(self):
+        try:
+            response = self.transport.request('GET', f"{self.base_url}/v1/models",
+                                              headers=self._headers())
+        except OSError:
+            return False
+        return response.status == 200
+
+class HuggingFaceLLM:
+    """Local transformers causal LM, run in-process (CPU by default).
+    
+    transformers (and torch) are imported on construction, so the module
+    works without them. generate_batch pads the prompts into one forward
+    pass; wrap the model in a BatchingLLM to batch concurrent callers.
+    """
+    
+    def __init__(self, provider="transformers", model_name="sshleifer/tiny-gpt2",
+                 device="cpu", temperature=0.7, max_tokens=128, pricing=None):
+        try:
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as exc:
+            raise ImportError("HuggingFaceLLM needs transformers and torch: "
+                              "pip install transformers torch") from exc
+        self.provider = provider
+        self.model_name = model_name or "sshleifer/tiny-gpt2"
+        self.device = device
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.pricing = pricing or (0.0, 0.0)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, padding_side='left')
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(self.model_name).to(device)
+        self.model.eval()
+        
+    def generate_batch(self, prompts, max_tokens=None):
+        """Complete prompts in a single padded forward pass."""
+        import torch
+        
+        started = time.perf_counter()
+        inputs = self.tokenizer(list(prompts), return_tensors='pt', padding=True).to(self.device)
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens or self.max_tokens,
+                do_sample=self.temperature > 0,
+                temperature=self.temperature if self.temperature > 0 else None,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+        elapsed = time.perf_counter() - started
+        
+        prompt_length = inputs['input_ids'].shape[1]
+        responses = []
+        for i, output in enumerate(outputs):
+            new_tokens = output[prompt_length:]
+            content = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+            responses.append(LLMResponse(
+                content, elapsed,
+                prompt_tokens=int(inputs['attention_mask'][i].sum()),
+                completion_tokens=int((new_tokens != self.tokenizer.pad_token_id).sum())
+            ))
+        return responses
+    
+    def generate(self, prompt, max_tokens=None):
+        return self.generate_batch([prompt], max_tokens)[0]
+    
+    async def agenerate(self, prompt, max_tokens=None):
+        """Async counterpart of generate, run on a worker thread."""
+        return await asyncio.to_thread(self.generate, prompt, max_tokens)
+    
+    def get_provider_info(self):
+        return {
+            "provider": self.provider,
+            "model": self.model_name,
+            "device": self.device,
+            "description": "Local transformers model"
+        }
+    
+    def test_connection(self):
+        return True
+
+class LLMWrapper:
+    """Base for layers that wrap an LLM, delegating whatever they don't override."""
+    
+    def __init__(self, llm):
+        self.llm = llm
+        
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+    
+    def generate(self, prompt, **kwargs):
+        return self.llm.generate(prompt, **kwargs)
+    
+    async def agenerate(self, prompt, **kwargs):
+        agenerate = getattr(self.llm, 'agenerate', None)
+        if agenerate is not None:
+            return await agenerate(prompt, **kwargs)
+        return await asyncio.to_thread(self.llm.generate, prompt, **kwargs)
+
+class CacheMissError(LookupError):
+    """A replay-mode CachedLLM was asked for a prompt it never recorded."""
+
+def response_cache_key(llm, prompt, max_tokens=None):
+    """Cache key for a completion: provider, model, sampling params and prompt hash."""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    params = [
+        getattr(llm, 'provider', None),
+        getattr(llm, 'model_name', None),
+        getattr(llm, 'temperature', None),
+        max_tokens if max_tokens is not None else getattr(llm, 'max_tokens', None),
+        prompt_hash
+    ]
+    return hashlib.sha256(json.dumps(params).encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Completion store with an in-memory LRU, optional SQLite file and TTL.
+    
+    Entries older than ttl seconds are treated as misses and dropped.
+    """
+    
+    def __init__(self, max_size=1024, path=None, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = SQLiteStore(path, table='llm_responses') if path else None
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _fresh(self, created):
+        return self.ttl is None or time.time() - created <= self.ttl
+    
+    def get(self, key):
+        """Return the cached response dict for key, or None on a miss."""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._lru.pop(key, None)
+        
+        stored = self.store.get(key) if self.store is not None else None
+        if stored is not None and not self._fresh(stored[1]):
+            self.store.delete(key)
+            stored = None
+        
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, stored[0], stored[1])
+            return stored[0]
+    
+    def put(self, key, value):
+        """Cache a response dict under key."""
+        with self._lock:
+            self._remember(key, value, time.time())
+        if self.store is not None:
+            self.store.set(key, value)
+    
+    def _remember(self, key, value, created):
+        self._lru[key] = (value, created)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+    
+    def stats(self):
+        """Return hit/miss counters for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._lru),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+_response_caches = {}
+_response_caches_lock = threading.Lock()
+
+def get_response_cache(path=None, ttl=None):
+    """Return the process-wide ResponseCache for an SQLite path (in-memory for None)."""
+    with _response_caches_lock:
+        if path not in _response_caches:
+            _response_caches[path] = ResponseCache(path=path, ttl=ttl)
+        return _response_caches[path]
+
+class CachedLLM(LLMWrapper):
+    """LLM wrapper that serves repeated prompts from a ResponseCache.
+    
+    Modes:
+        'read_write': serve hits, call the LLM and store on misses (default)
+        'record': always call the LLM and store the response
+        'replay': serve hits only; a miss raises CacheMissError
+    
+    Hits cost nothing, so their responses report zero tokens and zero
+    response time.
+    """
+    
+    MODES = ('read_write', 'record', 'replay')
+    
+    def __init__(self, llm, cache=None, mode='read_write'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}; expected one of {self.MODES}")
+        super().__init__(llm)
+        self.cache = cache if cache is not None else ResponseCache()
+        self.mode = mode
+        
+    def _lookup(self, prompt, max_tokens):
+        key = response_cache_key(self.llm, prompt, max_tokens)
+        if self.mode == 'record':
+            return key, None
+        cached = self.cache.get(key)
+        if cached is None and self.mode == 'replay':
+            raise CacheMissError(f"No recorded response for prompt {prompt[:60]!r}")
+        return key, cached
+    
+    @staticmethod
+    def _hit(cached):
+        response = LLMResponse(cached['content'], 0.0)
+        response.cached = True
+        return response
+    
+    def _store(self, key, response):
+        self.cache.put(key, {
+            'content': response.content,
+            'response_time': response.response_time,
+            'prompt_tokens': response.prompt_tokens,
+            'completion_tokens': response.completion_tokens
+        })
+        return response
+    
+    def generate(self, prompt, **kwargs):
+        key, cached = self._lookup(prompt, kwargs.get('max_tokens'))
+        if cached is not None:
+            return self._hit(cached)
+        return self._store(key, self.llm.generate(prompt, **kwargs))
+    
+    async def agenerate(self, prompt, **kwargs):
+        key, cached = self._lookup(prompt, kwargs.get('max_tokens'))
+        if cached is not None:
+            return self._hit(cached)
+        return self._store(key, await super().agenerate(prompt, **kwargs))
+    
+    def stream(self, prompt, **kwargs):
+        """Stream a completion, replaying a cached one as a single chunk."""
+        key, cached = self._lookup(prompt, kwargs.get('max_tokens'))
+        if cached is not None:
+            yield cached['content']
+            return
+        parts = []
+        for chunk in self.llm.stream(prompt, **kwargs):
+            parts.append(chunk)
+            yield chunk
+        content = ''.join(parts)
+        self._store(key, LLMResponse(content, 0.0, estimate_tokens(prompt), estimate_tokens(content)))
+    
+    async def astream(self, prompt, **kwargs):
+        """Async counterpart of stream."""
+        key, cached = self._lookup(prompt, kwargs.get('max_tokens'))
+        if cached is not None:
+            yield cached['content']
+            return
+        parts = []
+        async for chunk in self.llm.astream(prompt, **kwargs):
+            parts.append(chunk)
+            yield chunk
+        content = ''.join(parts)
+        self._store(key, LLMResponse(content, 0.0, estimate_tokens(prompt), estimate_tokens(content)))
+    
+    def cache_stats(self):
+        """Return the underlying cache's hit/miss counters."""
+        return self.cache.stats()
+
+class CoalescingLLM(LLMWrapper):
+    """LLM wrapper that merges identical in-flight generate calls (single flight).
+    
+    The first caller for a prompt (keyed like the response cache, plus any
+    other generate kwargs) becomes the leader and makes the upstream request;
+    callers arriving while it is in flight wait for it and get its content.
+    Followers' responses report zero tokens, since only the leader's request
+    is paid for. Streaming calls are passed through unmerged.
+    """
+    
+    def __init__(self, llm):
+        super().__init__(llm)
+        self.requests = 0
+        self.upstream = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, prompt, kwargs):
+        extra = sorted((name, repr(value)) for name, value in kwargs.items() if name != 'max_tokens')
+        return (response_cache_key(self.llm, prompt, kwargs.get('max_tokens')), tuple(extra))
+    
+    def _join(self, key, new_future):
+        """Return (future, is_leader), registering new_future() if nothing is in flight."""
+        with self._lock:
+            self.requests += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = new_future()
+            self.upstream += 1
+            return future, True
+    
+    def _release(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+    
+    @staticmethod
+    def _shared(response):
+        shared = LLMResponse(response.content, response.response_time)
+        shared.coalesced = True
+        return shared
+    
+    def generate(self, prompt, **kwargs):
+        key = self._key(prompt, kwargs)
+        future, leader = self._join(key, Future)
+        if not leader:
+            return self._shared(future.result())
+        try:
+            response = self.llm.generate(prompt, **kwargs)
+        except BaseException as exc:
+            self._release(key)
+            future.set_exception(exc)
+            raise
+        self._release(key)
+        future.set_result(response)
+        return response
+    
+    async def agenerate(self, prompt, **kwargs):
+        loop = asyncio.get_running_loop()
+        key = (id(loop), self._key(prompt, kwargs))
+        future, leader = self._join(key, loop.create_future)
+        if not leader:
+            # Shield so a cancelled follower doesn't cancel the shared request.
+            return self._shared(await asyncio.shield(future))
+        try:
+            response = await super().agenerate(prompt, **kwargs)
+        except BaseException as exc:
+            self._release(key)
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                # Mark retrieved so an exception nobody awaited isn't logged.
+                future.exception()
+            raise
+        self._release(key)
+        future.set_result(response)
+        return response
+    
+    def coalesce_stats(self):
+        """Return how many calls were made, sent upstream and deduplicated."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'upstream': self.upstream,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._inflight)
+            }
+
+class RateLimitError(RuntimeError):
+    """The provider throttled a request (HTTP 429/503 or equivalent)."""
+    
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Token bucket refilled continuously at per_minute tokens per minute.
+    
+    reserve() takes tokens immediately, letting the balance go negative, and
+    returns how long the caller must wait before its share is actually
+    available; this keeps callers in arrival order without a wait queue.
+    """
+    
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, amount=1):
+        """Take amount tokens and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+    
+    def adjust(self, amount):
+        """Give back (positive) or take (negative) tokens after the real cost is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: grows by about one per limit's worth of
+    successes and is cut by decrease_factor on throttling, at most once per
+    cooldown so one burst of 429s doesn't collapse it to the minimum.
+    """
+    
+    def __init__(self, max_concurrency=16, min_concurrency=1, decrease_factor=0.5, cooldown=1.0):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+        # (loop, future) of coroutines parked in aacquire, oldest first
+        self._async_waiters = deque()
+    
+    def try_acquire(self):
+        """Take a slot if one is free under the current limit."""
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+    
+    def acquire(self):
+        """Block until a slot is free under the current limit."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+    
+    async def aacquire(self):
+        """Async counterpart of acquire; parks on a future that release() wakes."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._condition:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        # Already woken for a free slot: pass the wakeup on
+                        self._wake_async_waiters()
+                raise
+    
+    def _wake_async_waiters(self):
+        # Callers hold self._condition; wakes one waiter per free slot
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # Its event loop is closed; nobody is waiting on it any more
+                continue
+            free -= 1
+    
+    def release(self, throttled=False):
+        """Free a slot, growing the limit on success and cutting it on throttling."""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+            self._wake_async_waiters()
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+class RateLimiter:
+    """Client-side budget for one provider/model: requests per minute,
+    tokens per minute and an adaptive concurrency limit.
+    """
+    
+    def __init__(self, rpm=None, tpm=None, max_concurrency=16):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.throttled = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+    
+    def _reserve(self, tokens):
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+    
+    def acquire(self, tokens):
+        """Wait for a concurrency slot and budget for one request of ~tokens."""
+        self.concurrency.acquire()
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+    
+    async def aacquire(self, tokens):
+        """Async counterpart of acquire."""
+        await self.concurrency.aacquire()
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+    
+    def release(self, reserved, used=None, throttled=False):
+        """Finish a request, refunding unused token budget and adapting concurrency."""
+        if self.tokens is not None and used is not None:
+            self.tokens.adjust(reserved - used)
+        if throttled:
+            with self._lock:
+                self.throttled += 1
+        self.concurrency.release(throttled)
+    
+    def stats(self):
+        """Return throttling, waiting and concurrency counters."""
+        return {
+            'throttled': self.throttled,
+            'seconds_waited': self.waited,
+            'concurrency_limit': self.concurrency.limit,
+            'concurrency_decreases': self.concurrency.decreases,
+            'in_flight': self.concurrency.in_flight
+        }
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider, model_name, rpm=None, tpm=None, max_concurrency=None):
+    """Return the process-wide RateLimiter for a provider/model, creating it on first use.
+    
+    max_concurrency defaults to 16 for a new limiter. Settings passed for an
+    existing limiter must match it; a conflicting one raises ValueError
+    rather than being silently ignored. None leaves a setting unspecified.
+    """
+    key = (provider, model_name)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(rpm, tpm, max_concurrency or 16)
+            return _rate_limiters[key]
+        limiter = _rate_limiters[key]
+    configured = {'rpm': limiter.rpm, 'tpm': limiter.tpm,
+                  'max_concurrency': limiter.concurrency.max_concurrency}
+    requested = {'rpm': rpm, 'tpm': tpm, 'max_concurrency': max_concurrency}
+    conflicts = [f"{name}={value} (configured {configured[name]})"
+                 for name, value in requested.items()
+                 if value is not None and value != configured[name]]
+    if conflicts:
+        raise ValueError(f"Rate limiter for {provider}/{model_name} already exists with "
+                         f"different settings: {', '.join(conflicts)}")
+    return limiter
+
+class RateLimitedLLM(LLMWrapper):
+    """LLM wrapper that paces calls through a RateLimiter.
+    
+    Each call reserves the prompt's estimated tokens plus max_tokens, and
+    the unused part is refunded from the response's real usage. A
+    RateLimitError shrinks the concurrency limit and is retried up to
+    max_retries times, after the provider's Retry-After or an exponential
+    backoff.
+    """
+    
+    def __init__(self, llm, limiter, max_retries=3, backoff=1.0):
+        super().__init__(llm)
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+    
+    def _reservation(self, prompt, kwargs):
+        max_tokens = kwargs.get('max_tokens') or getattr(self.llm, 'max_tokens', None) or 0
+        return estimate_tokens(prompt) + max_tokens
+    
+    def _retry_delay(self, error, attempt):
+        if attempt >= self.max_retries:
+            return None
+        return error.retry_after if error.retry_after is not None else self.backoff * 2 ** attempt
+    
+    def generate(self, prompt, **kwargs):
+        reserved = self._reservation(prompt, kwargs)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(reserved)
+            try:
+                response = self.llm.generate(prompt, **kwargs)
+            except RateLimitError as error:
+                self.limiter.release(reserved, throttled=True)
+                delay = self._retry_delay(error, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.limiter.release(reserved, used=0)
+                raise
+            self.limiter.release(reserved, response.prompt_tokens + response.completion_tokens)
+            return response
+    
+    async def agenerate(self, prompt, **kwargs):
+        reserved = self._reservation(prompt, kwargs)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.aacquire(reserved)
+            try:
+                response = await super().agenerate(prompt, **kwargs)
+            except RateLimitError as error:
+                self.limiter.release(reserved, throttled=True)
+                delay = self._retry_delay(error, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.limiter.release(reserved, used=0)
+                raise
+            self.limiter.release(reserved, response.prompt_tokens + response.completion_tokens)
+            return response
+    
+    def stream(self, prompt, **kwargs):
+        """Stream a completion inside one rate-limited slot (not retried)."""
+        reserved = self._reservation(prompt, kwargs)
+        self.limiter.acquire(reserved)
+        parts = []
+        throttled = False
+        try:
+            for chunk in self.llm.stream(prompt, **kwargs):
+                parts.append(chunk)
+                yield chunk
+        except RateLimitError:
+            throttled = True
+            raise
+        finally:
+            used = estimate_tokens(prompt) + estimate_tokens(''.join(parts))
+            self.limiter.release(reserved, used, throttled=throttled)
+    
+    async def astream(self, prompt, **kwargs):
+        """Async counterpart of stream."""
+        reserved = self._reservation(prompt, kwargs)
+        await self.limiter.aacquire(reserved)
+        parts = []
+        throttled = False
+        try:
+            async for chunk in self.llm.astream(prompt, **kwargs):
+                parts.append(chunk)
+                yield chunk
+        except RateLimitError:
+            throttled = True
+            raise
+        finally:
+            used = estimate_tokens(prompt) + estimate_tokens(''.join(parts))
+            self.limiter.release(reserved, used, throttled=throttled)
+    
+    def rate_limit_stats(self):
+        """Return the shared limiter's counters."""
+        return self.limiter.stats()
+
+class CircuitOpenError(RuntimeError):
+    """A call was rejected because the provider's circuit breaker is open."""
+
+class CircuitBreakerLLM(LLMWrapper):
+    """LLM wrapper that gates every call on a circuit breaker.
+    
+    breaker is any object with allow(), record_success(), record_failure()
+    and release(), such as provider_health.CircuitBreaker. A call the
+    breaker rejects raises CircuitOpenError without reaching the provider;
+    the outcome of every call that goes through is reported back, so a
+    failing provider is cut off after the breaker's threshold rather than
+    once per run.
+    """
+    
+    def __init__(self, llm, breaker):
+        super().__init__(llm)
+        self.breaker = breaker
+        self.rejected = 0
+    
+    def _admit(self):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(
+                f"Circuit open for {getattr(self.llm, 'provider', 'provider')}; call rejected")
+    
+    def generate(self, prompt, **kwargs):
+        self._admit()
+        try:
+            response = self.llm.generate(prompt, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return response
+    
+    async def agenerate(self, prompt, **kwargs):
+        self._admit()
+        try:
+            response = await super().agenerate(prompt, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return response
+    
+    def stream(self, prompt, **kwargs):
+        """Stream through the breaker; an abandoned stream is not a verdict."""
+        self._admit()
+        try:
+            yield from self.llm.stream(prompt, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+    
+    async def astream(self, prompt, **kwargs):
+        """Async counterpart of stream."""
+        self._admit()
+        try:
+            async for chunk in self.llm.astream(prompt, **kwargs):
+                yield chunk
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+def _resolve(future, result=None, exc=None):
+    """Complete future unless its caller already cancelled it."""
+    try:
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+# Queued by BatchingLLM.close() to stop its dispatcher thread
+_STOP_DISPATCH = object()
+
+class BatchingLLM(LLMWrapper):
+    """LLM wrapper that micro-batches concurrent generate calls.
+    
+    Calls are queued for a dispatcher thread, which waits up to max_wait_ms
+    after the first queued prompt (or until max_batch_size are queued),
+    runs them through the wrapped LLM's generate_batch in one go and hands
+    each caller its own response. Calls with different max_tokens go in
+    separate batches. close() runs what is already queued and stops the
+    dispatcher.
+    """
+    
+    def __init__(self, llm, max_batch_size=8, max_wait_ms=10):
+        if not hasattr(llm, 'generate_batch'):
+            raise TypeError(f"{type(llm).__name__} has no generate_batch to batch with")
+        super().__init__(llm)
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.batched_prompts = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._dispatcher = None
+        self._closed = False
+        self._lock = threading.Lock()
+    
+    def _submit(self, prompt, max_tokens):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchingLLM is closed")
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='llm-batcher',
+                                                    daemon=True)
+                self._dispatcher.start()
+            self._queue.put((prompt, max_tokens, future))
+        return future
+    
+    def close(self):
+        """Run the prompts already queued, then stop the dispatcher thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            dispatcher = self._dispatcher
+            if dispatcher is not None:
+                self._queue.put(_STOP_DISPATCH)
+        if dispatcher is not None and dispatcher is not threading.current_thread():
+            dispatcher.join()
+    
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP_DISPATCH:
+                break
+            pending = [item]
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP_DISPATCH:
+                    stopping = True
+                    break
+                pending.append(item)
+            
+            groups = {}
+            for item in pending:
+                groups.setdefault(item[1], []).append(item)
+            for max_tokens, items in groups.items():
+                self._run_batch(max_tokens, items)
+    
+    def _run_batch(self, max_tokens, items):
+        prompts = [prompt for prompt, _, _ in items]
+        kwargs = {'max_tokens': max_tokens} if max_tokens is not None else {}
+        try:
+            responses = list(self.llm.generate_batch(prompts, **kwargs))
+        except BaseException as exc:
+            # Even KeyboardInterrupt/SystemExit go to the callers; the
+            # dispatcher keeps serving the queue.
+            for _, _, future in items:
+                _resolve(future, exc=exc)
+            return
+        with self._lock:
+            self.batches += 1
+            self.batched_prompts += len(items)
+            self.largest_batch = max(self.largest_batch, len(items))
+        for (_, _, future), response in zip(items, responses):
+            _resolve(future, result=response)
+        if len(responses) < len(items):
+            error = RuntimeError(f"generate_batch returned {len(responses)} responses "
+                                 f"for {len(items)} prompts")
+            for _, _, future in items[len(responses):]:
+                _resolve(future, exc=error)
+    
+    def generate(self, prompt, max_tokens=None):
+        return self._submit(prompt, max_tokens).result()
+    
+    async def agenerate(self, prompt, max_tokens=None):
+        return await asyncio.wrap_future(self._submit(prompt, max_tokens))
+    
+    def batch_stats(self):
+        """Return how many batches ran and how full they were."""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'prompts': self.batched_prompts,
+                'largest_batch': self.largest_batch,
+                'mean_batch_size': self.batched_prompts / self.batches if self.batches else 0.0
+            }
+
+class HedgedLLM(LLMWrapper):
+    """LLM wrapper that hedges slow calls with a duplicate request.
+    
+    Once min_samples latencies have been seen, a call still running after
+    the observed percentile (p95 by default) fires a duplicate, to the
+    secondary LLM if one is given, else to the same LLM. The first good
+    response wins. An async loser is cancelled; a sync loser is cancelled
+    if it hasn't started, otherwise it runs to completion on its worker
+    thread. Tokens spent by losers are tallied in hedge_stats() rather
+    than in the winning response (a cancelled in-flight loser counts its
+    prompt's estimated tokens).
+    """
+    
+    def __init__(self, llm, secondary=None, percentile=95, min_samples=20,
+                 window=200, max_workers=32):
+        super().__init__(llm)
+        self.secondary = secondary
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.extra_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0}
+        self._latencies = deque(maxlen=window)
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def hedge_delay(self):
+        """Seconds after which a call is hedged, or None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < max(1, self.min_samples):
+                return None
+            return _percentile(sorted(self._latencies), self.percentile)
+    
+    def _record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+    
+    def _latency_callback(self, started):
+        def record(future):
+            # A cancelled primary still records its (censored) latency so the
+            # tail estimate doesn't shrink just because slow calls were hedged.
+            if future.cancelled() or future.exception() is None:
+                self._record_latency(time.perf_counter() - started)
+        return record
+    
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+    
+    def _charge(self, llm, prompt_tokens, completion_tokens):
+        prompt_price, completion_price = getattr(llm, 'pricing', (0.0, 0.0))
+        with self._lock:
+            self.extra_usage['prompt_tokens'] += prompt_tokens
+            self.extra_usage['completion_tokens'] += completion_tokens
+            self.extra_usage['cost_usd'] += (prompt_tokens * prompt_price
+                                             + completion_tokens * completion_price) / 1000
+    
+    def _charge_loser(self, llm, prompt, future):
+        if future.cancelled():
+            self._charge(llm, estimate_tokens(prompt), 0)
+        elif future.exception() is None:
+            response = future.result()
+            self._charge(llm, response.prompt_tokens, response.completion_tokens)
+    
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix='hedge')
+            return self._executor
+    
+    def _hedge_target(self):
+        return self.secondary if self.secondary is not None else self.llm
+    
+    def _won(self, response, by_hedge):
+        response.hedged = True
+        if by_hedge:
+            self._count('hedge_wins')
+        return response
+    
+    def generate(self, prompt, **kwargs):
+        self._count('requests')
+        delay = self.hedge_delay()
+        started = time.perf_counter()
+        if delay is None:
+            response = self.llm.generate(prompt, **kwargs)
+            self._record_latency(time.perf_counter() - started)
+            return response
+        
+        pool = self._pool()
+        primary = pool.submit(self.llm.generate, prompt, **kwargs)
+        primary.add_done_callback(self._latency_callback(started))
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        
+        self._count('hedged')
+        target = self._hedge_target()
+        hedge = pool.submit(target.generate, prompt, **kwargs)
+        owners = {primary: self.llm, hedge: target}
+        winner, error, pending = None, None, set(owners)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = winner or future
+                else:
+                    error = error or future.exception()
+        if winner is None:
+            raise error
+        
+        for loser, llm in owners.items():
+            if loser is not winner and (loser.done() or not loser.cancel()):
+                loser.add_done_callback(lambda f, llm=llm: self._charge_loser(llm, prompt, f))
+        return self._won(winner.result(), winner is hedge)
+    
+    async def _acall(self, llm, prompt, kwargs):
+        agenerate = getattr(llm, 'agenerate', None)
+        if agenerate is not None:
+            return await agenerate(prompt, **kwargs)
+        return await asyncio.to_thread(llm.generate, prompt, **kwargs)
+    
+    async def agenerate(self, prompt, **kwargs):
+        self._count('requests')
+        delay = self.hedge_delay()
+        started = time.perf_counter()
+        if delay is None:
+            response = await self._acall(self.llm, prompt, kwargs)
+            self._record_latency(time.perf_counter() - started)
+            return response
+        
+        primary = asyncio.ensure_future(self._acall(self.llm, prompt, kwargs))
+        primary.add_done_callback(self._latency_callback(started))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        
+        self._count('hedged')
+        target = self._hedge_target()
+        hedge = asyncio.ensure_future(self._acall(target, prompt, kwargs))
+        owners = {primary: self.llm, hedge: target}
+        winner, error, pending = None, None, set(owners)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        winner = winner or future
+                    else:
+                        error = error or future.exception()
+        finally:
+            for loser in pending:
+                loser.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            for loser, llm in owners.items():
+                if loser is not winner and loser.done():
+                    self._charge_loser(llm, prompt, loser)
+        if winner is None:
+            raise error
+        return self._won(winner.result(), winner is hedge)
+    
+    def hedge_stats(self):
+        """Return hedging counters, the current hedge delay and the losers' extra usage."""
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'hedge_delay': delay,
+                'extra_usage': dict(self.extra_usage)
+            }
+
 class LLMFactory:
     @staticmethod
     def create_llm(provider="mock", model_name=None, **kwargs):
-        return MockLLM(provider, model_name)
+        if provider == "http":
+            llm = HTTPLLM(provider, model_name,
+                          base_url=kwargs.get('base_url', "http://127.0.0.1:8000"),
+                          api_key=kwargs.get('api_key'),
+                          temperature=kwargs.get('temperature', 0.7),
+                          max_tokens=kwargs.get('max_tokens', 1000),
+                          transport=get_shared_transport(http2=kwargs.get('http2', False)),
+                          pricing=kwargs.get('pricing'))
+        elif provider == "transformers":
+            llm = HuggingFaceLLM(provider, model_name,
+                                 device=kwargs.get('device', "cpu"),
+                                 temperature=kwargs.get('temperature', 0.7),
+                                 max_tokens=kwargs.get('max_tokens', 128),
+                                 pricing=kwargs.get('pricing'))
+        else:
+            llm = MockLLM(provider, model_name, pricing=kwargs.get('pricing'),
+                          token_delay=kwargs.get('token_delay', 0.0),
+                          temperature=kwargs.get('temperature', 0.7),
+                          forward_latency=kwargs.get('forward_latency', 0.0),
+                          latency_model=LLMFactory.mock_latency_model(provider, **kwargs))
+        return LLMFactory.wrap(llm, **kwargs)
+    
+    @staticmethod
+    def mock_latency_model(provider, **kwargs):
+        """Build the MockLatencyModel selected by kwargs, or None.
+        
+        Recognized kwargs:
+            latency_profile: PROVIDER_PROFILES name, a dict with
+                speed_base/speed_variance, or True for the provider's own
+            latency_scale: Multiplier on sampled latencies (default 1.0)
+            latency_seed: RNG seed (default 0)
+            error_rate: Fraction of calls failing with an injected error
+            throttle_rate: Fraction of calls rejected with RateLimitError
+        """
+        profile = kwargs.get('latency_profile')
+        error_rate = kwargs.get('error_rate', 0.0)
+        throttle_rate = kwargs.get('throttle_rate', 0.0)
+        if not (profile or error_rate or throttle_rate):
+            return None
+        options = {
+            'seed': kwargs.get('latency_seed', 0),
+            'scale': kwargs.get('latency_scale', 1.0),
+            'error_rate': error_rate,
+            'throttle_rate': throttle_rate
+        }
+        if isinstance(profile, dict):
+            return MockLatencyModel(profile['speed_base'], profile['speed_variance'], **options)
+        if not profile:
+            # Injected failures only: keep calls near-instant.
+            return MockLatencyModel(0.0, 0.0, min_latency=0.0, **options)
+        return MockLatencyModel.for_provider(provider if profile is True else profile, **options)
+    
+    @staticmethod
+    def wrap(llm, **kwargs):
+        """Layer the optional LLM wrappers selected by kwargs around llm.
+        
+        Recognized kwargs:
+            response_cache: ResponseCache, SQLite path, or True for an
+                in-memory cache shared process-wide
+            cache_mode: CachedLLM mode ('read_write', 'record', 'replay')
+            cache_ttl: Seconds before a cached response expires
+            coalesce: Merge identical concurrent generate calls (CoalescingLLM)
+            rate_limit_rpm: Requests per minute allowed for this provider/model
+            rate_limit_tpm: Tokens per minute allowed for this provider/model
+            max_concurrency: Ceiling for the adaptive concurrency limit
+            rate_limit_retries: Retries of a throttled request (default 3)
+            batch_size: Micro-batch up to this many concurrent prompts
+                (BatchingLLM; needs an LLM with generate_batch)
+            batch_wait_ms: How long a batch waits to fill (default 10)
+            hedge: Hedge calls slower than the observed p95 (HedgedLLM)
+            hedge_percentile: Latency percentile that triggers a hedge (default 95)
+            hedge_provider / hedge_model: Send hedges to this secondary LLM
+                instead of duplicating on the primary
+            circuit_breaker: Breaker every provider call is gated on
+                (CircuitBreakerLLM)
+        
+        The rate limiter sits outside batching but inside the cache, so a
+        batch counts once per prompt and cache hits and coalesced calls
+        don't spend provider budget. The circuit breaker sits just outside
+        the rate limiter, so rejected calls spend no budget either.
+        """
+        batch_size = kwargs.get('batch_size')
+        if batch_size and batch_size > 1:
+            llm = BatchingLLM(llm, max_batch_size=batch_size,
+                              max_wait_ms=kwargs.get('batch_wait_ms', 10))
+        rpm = kwargs.get('rate_limit_rpm')
+        tpm = kwargs.get('rate_limit_tpm')
+        max_concurrency = kwargs.get('max_concurrency')
+        if rpm or tpm or max_concurrency:
+            limiter = get_rate_limiter(getattr(llm, 'provider', None), getattr(llm, 'model_name', None),
+                                       rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+            llm = RateLimitedLLM(llm, limiter, max_retries=kwargs.get('rate_limit_retries', 3))
+        if kwargs.get('circuit_breaker') is not None:
+            llm = CircuitBreakerLLM(llm, kwargs['circuit_breaker'])
+        if kwargs.get('hedge'):
+            secondary = None
+            if kwargs.get('hedge_provider'):
+                secondary = LLMFactory.create_llm(kwargs['hedge_provider'], kwargs.get('hedge_model'))
+            llm = HedgedLLM(llm, secondary, percentile=kwargs.get('hedge_percentile', 95))
+        response_cache = kwargs.get('response_cache')
+        if response_cache:
+            if not isinstance(response_cache, ResponseCache):
+                path = None if response_cache is True else response_cache
+                response_cache = get_response_cache(path, ttl=kwargs.get('cache_ttl'))
+            llm = CachedLLM(llm, response_cache, mode=kwargs.get('cache_mode', 'read_write'))
+        if kwargs.get('coalesce'):
+            # Outside the cache, so concurrent misses for one prompt make a single call.
+            llm = CoalescingLLM(llm)
+        return llm
 
-def create_refinement_engine(provider="mock", model=None, max_iterations=5, **kwargs):
-    """Create a refinement engine with the specified LLM provider."""
+def create_refinement_engine(provider="mock", model=None, max_iterations=5,
+                             quality_threshold=0.8, convergence_epsilon=0.01,
+                             quality_cache=None, checkpoint_dir=None,
+                             beam_candidates=1, beam_width=1, streaming=False,
+                             prompt_token_budget=None, **kwargs):
+    """Create a refinement engine with the specified LLM provider.
+    
+    prompt_token_budget enables a PromptBuilder that feeds the refinement
+    history back into each prompt within that many tokens.
+    """
     llm = LLMFactory.create_llm(provider, model, **kwargs)
-    engine = RefinementEngine(max_iterations=max_iterations)
+    engine = RefinementEngine(max_iterations=max_iterations,
+                              quality_threshold=quality_threshold,
+                              convergence_epsilon=convergence_epsilon,
+                              quality_cache=quality_cache,
+                              checkpoint_dir=checkpoint_dir,
+                              beam_candidates=beam_candidates,
+                              beam_width=beam_width,
+                              streaming=streaming,
+                              prompt_builder=(PromptBuilder(prompt_token_budget)
+                                              if prompt_token_budget else None))
     engine.llm = llm
     return engine
\ No newline at end of file
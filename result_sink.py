@@ -0,0 +1,104 @@
+"""Streaming JSONL sink for evaluation results with running statistics."""
+
+import json
+import os
+from typing import Dict, Any, Iterator
+
+from evaluation_stats import EvaluationStats
+from refinement_engine import encode_results_json
+
+
+class JSONLResultSink:
+    """JSON Lines file of evaluation results, written one result at a time.
+
+    write() appends one compact JSON line per result, flushes it and folds
+    the result into an EvaluationStats; no result is kept in memory, and a
+    crash loses at most the line being written. Iterating the sink reads
+    the results back from disk. With append=True an existing file is
+    continued and its results are counted in the statistics.
+
+    Usage:
+        with JSONLResultSink('results/sweep.jsonl') as sink:
+            for result in evaluations:
+                sink.write(result)
+            print(sink.stats.to_dict())
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.stats = EvaluationStats()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if append and os.path.exists(path):
+            # Carry on from an earlier run: count its results and drop a
+            # line torn by a crash so new lines start on a clean boundary.
+            valid = 0
+            complete = True
+            with open(path, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        try:
+                            self.stats.update(json.loads(line))
+                        except json.JSONDecodeError:
+                            break
+                    valid += len(line)
+                    complete = line.endswith(b'\n')
+            with open(path, 'r+b') as f:
+                f.truncate(valid)
+                if not complete:
+                    f.seek(valid)
+                    f.write(b'\n')
+        self._file = open(path, 'ab' if append else 'wb')
+
+    def write(self, result: Dict[str, Any]):
+        """Append and flush one result."""
+        self._file.write(encode_results_json(result) + b'\n')
+        self._file.flush()
+        self.stats.update(result)
+
+    def __len__(self):
+        return self.stats.count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter_results(self.path)
+
+    def write_json(self, f, head: Dict[str, Any], key: str = 'detailed_results'):
+        """Write head as a JSON object to binary file f, with every stored
+        result under key, copying the JSONL lines instead of loading them."""
+        f.write(json.dumps(head, separators=(',', ':')).encode('utf-8')[:-1])
+        f.write(b',' if head else b'')
+        f.write(json.dumps(key).encode('utf-8') + b':[')
+        if not self._file.closed:
+            self._file.flush()
+        with open(self.path, 'rb') as source:
+            first = True
+            for line in source:
+                line = line.rstrip(b'\n')
+                if not line:
+                    continue
+                if not first:
+                    f.write(b',')
+                f.write(line)
+                first = False
+        f.write(b']}')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_results(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the results stored in a JSONL file, skipping a torn last line."""
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash mid-write; nothing follows it.
+                return
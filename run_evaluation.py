@@ -17,16 +17,20 @@ Usage examples:
 """
 
 import argparse
-import json
 import os
 import sys
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from refinement_engine import create_refinement_engine
+from refinement_engine import create_refinement_engine, encode_results_json, public_result
+from provider_health import get_health_monitor
+from evaluation_runner import (add_llm_arguments, aggregate_results, evaluate_in_processes,
+                               llm_kwargs_from_args, result_stats, write_results_csv)
+from result_sink import JSONLResultSink
+from run_manifest import RunManifest
 from srlp_framework.core.metrics_calculator import BasicMetricsCalculator
 from srlp_framework.test_scenarios import get_scenario_by_name, get_all_test_scenarios
 from srlp_framework.utils.visualization import generate_all_visualizations
@@ -72,19 +76,62 @@ def run_evaluation_with_llm(scenario_name: str, provider: str = "mock",
         return {}
     
     # Create LLM-enabled refinement engine
+    refinement_engine, llm_info = create_engine_with_fallback(
+        provider, model_name, iterations, **llm_kwargs
+    )
+    
+    # Run refinement process
+    print("🔄 Starting refinement process...")
+    start_time = time.time()
+    
+    try:
+        refinement_result = refinement_engine.refine_plan(problem)
+        results = evaluate_refinement(scenario_name, problem, refinement_result, llm_info,
+                                      time.time() - start_time)
+        
+        # Export results if requested
+        if export_path:
+            export_results(results, export_path)
+        
+        return public_result(results)
+        
+    except Exception as e:
+        print(f"❌ Error during evaluation: {e}")
+        return {}
+
+
+def create_engine_with_fallback(provider: str = "mock", model_name: Optional[str] = None,
+                                iterations: int = 3, **llm_kwargs):
+    """
+    Create a refinement engine for a provider, falling back to mock on failure.
+    
+    Returns:
+        Tuple of (refinement engine, LLM provider info)
+    """
+    
     try:
         print(f"🔧 Initializing {provider} LLM provider...")
         
+        # Every LLM call gates on and reports to the provider's shared breaker
+        monitor = get_health_monitor()
         refinement_engine = create_refinement_engine(
             provider=provider,
-            model_name=model_name,
+            model=model_name,
             max_iterations=iterations,
+            circuit_breaker=monitor.breaker(provider, model_name),
             **llm_kwargs
         )
         
-        # Test connection
-        if not refinement_engine.test_connection():
-            print(f"⚠️  Warning: Could not connect to {provider}. Using mock provider as fallback.")
+        # Consult cached provider health; only the first engine for a
+        # provider probes inline, after that it is refreshed in the background
+        monitor.watch(provider, model_name, refinement_engine.test_connection)
+        if not monitor.available(provider, model_name):
+            status = monitor.status(provider, model_name)
+            if not status['healthy']:
+                reason = status['error'] or "connection test failed"
+            else:
+                reason = f"circuit breaker {status['breaker']}"
+            print(f"⚠️  Warning: {provider} is unavailable ({reason}). Using mock provider as fallback.")
             refinement_engine = create_refinement_engine(provider="mock", max_iterations=iterations)
         
         llm_info = refinement_engine.get_provider_info()
@@ -97,172 +144,206 @@ def run_evaluation_with_llm(scenario_name: str, provider: str = "mock",
         refinement_engine = create_refinement_engine(provider="mock", max_iterations=iterations)
         llm_info = refinement_engine.get_provider_info()
     
+    return refinement_engine, llm_info
+
+
+def evaluate_refinement(scenario_name: str, problem: Dict[str, Any], refinement_result,
+                        llm_info: Dict[str, Any], refinement_time: float) -> Dict[str, Any]:
+    """
+    Calculate, display and collect metrics for a finished refinement.
+    
+    Args:
+        scenario_name: Name of the evaluated scenario
+        problem: Problem specification that was refined
+        refinement_result: RefinementProcessSummary for the problem
+        llm_info: Provider info of the LLM that ran the refinement
+        refinement_time: Seconds spent in the refinement itself
+        
+    Returns:
+        Dictionary with evaluation results
+    """
+    
     # Initialize metrics calculator
     calculator = BasicMetricsCalculator()
-    
-    # Run refinement process
-    print("🔄 Starting refinement process...")
     start_time = time.time()
     
-    try:
-        refinement_result = refinement_engine.refine_plan(problem)
-        
-        # Extract plans and check results
-        initial_plan = refinement_result.initial_plan
-        final_plan = refinement_result.final_plan
-        
-        # Get check results from refinement history
-        initial_check_data = refinement_result.refinement_history[0]['check_result']
-        final_check_data = refinement_result.refinement_history[-1]['check_result']
-        
-        # Convert to CheckResult objects
-        from srlp_framework.core.self_checker import CheckResult
-        
-        initial_check = CheckResult(
-            overall_score=initial_check_data['overall_score'],
-            error_count=initial_check_data['error_count'],
-            errors=initial_check_data['errors'],
-            constraint_violations=initial_check_data['constraint_violations'],
-            uncertainty_scores=initial_check_data['uncertainty_scores'],
-            semantic_consistency=initial_check_data['semantic_consistency'],
-            completeness_score=initial_check_data['completeness_score']
-        )
-        
-        final_check = CheckResult(
-            overall_score=final_check_data['overall_score'],
-            error_count=final_check_data['error_count'],
-            errors=final_check_data['errors'],
-            constraint_violations=final_check_data['constraint_violations'],
-            uncertainty_scores=final_check_data['uncertainty_scores'],
-            semantic_consistency=final_check_data['semantic_consistency'],
-            completeness_score=final_check_data['completeness_score']
-        )
-        
-        # Calculate metrics
-        print("📊 Calculating metrics...")
-        metrics_before = calculator.calculate_metrics(initial_plan, problem, initial_check)
-        metrics_after = calculator.calculate_metrics(final_plan, problem, final_check)
-        improvement_metrics = calculator.compare_metrics(metrics_before, metrics_after)
-        
-        total_time = time.time() - start_time
-        
-        # Display results
-        print("\n" + "=" * 60)
-        print("📈 EVALUATION RESULTS")
-        print("=" * 60)
-        
-        print(f"⏱️  Total Processing Time: {total_time:.2f}s")
-        print(f"🔄 Refinement Iterations: {refinement_result.iterations}")
-        print(f"✅ Converged: {'Yes' if refinement_result.converged else 'No'}")
-        print()
-        
-        print("📊 Quality Metrics:")
-        print(f"   Initial Quality: {metrics_before.quality_metrics['overall_quality_score']:.3f}")
-        print(f"   Final Quality:   {metrics_after.quality_metrics['overall_quality_score']:.3f}")
-        print(f"   Improvement:     {improvement_metrics['overall_quality_score_absolute_improvement']:+.3f}")
-        print(f"   Relative Gain:   {improvement_metrics['overall_quality_score_relative_improvement']:+.1f}%")
-        print()
-        
-        print("🎯 Performance Metrics:")
-        if 'total_errors_absolute_improvement' in improvement_metrics:
-            print(f"   Error Reduction: {improvement_metrics['total_errors_absolute_improvement']:+.1f}")
-        else:
-            print(f"   Error Reduction: N/A")
-        print(f"   Completeness:    {metrics_after.quality_metrics['completeness_score']:.3f}")
-        print(f"   Consistency:     {metrics_after.quality_metrics['semantic_consistency']:.3f}")
-        print()
-        
-        print("🤖 LLM Information:")
-        print(f"   Provider: {llm_info.get('provider', 'unknown')}")
-        print(f"   Model:    {llm_info.get('model', 'unknown')}")
-        
-        # Prepare results
-        results = {
-            'scenario': scenario_name,
-            'problem': problem,
-            'refinement_result': refinement_result.to_dict(),
-            'metrics_before': metrics_before.to_dict(),
-            'metrics_after': metrics_after.to_dict(),
-            'improvement_metrics': improvement_metrics,
-            'llm_info': llm_info,
-            'evaluation_metadata': {
-                'total_time': total_time,
-                'timestamp': time.time(),
-                'framework_version': '1.0.0'
-            }
+    # Extract plans and check results
+    initial_plan = refinement_result.initial_plan
+    final_plan = refinement_result.final_plan
+    
+    # Get check results from refinement history
+    initial_check_data = refinement_result.refinement_history[0]['check_result']
+    final_check_data = refinement_result.refinement_history[-1]['check_result']
+    
+    # Convert to CheckResult objects
+    from srlp_framework.core.self_checker import CheckResult
+    
+    initial_check = CheckResult(
+        overall_score=initial_check_data['overall_score'],
+        error_count=initial_check_data['error_count'],
+        errors=initial_check_data['errors'],
+        constraint_violations=initial_check_data['constraint_violations'],
+        uncertainty_scores=initial_check_data['uncertainty_scores'],
+        semantic_consistency=initial_check_data['semantic_consistency'],
+        completeness_score=initial_check_data['completeness_score']
+    )
+    
+    final_check = CheckResult(
+        overall_score=final_check_data['overall_score'],
+        error_count=final_check_data['error_count'],
+        errors=final_check_data['errors'],
+        constraint_violations=final_check_data['constraint_violations'],
+        uncertainty_scores=final_check_data['uncertainty_scores'],
+        semantic_consistency=final_check_data['semantic_consistency'],
+        completeness_score=final_check_data['completeness_score']
+    )
+    
+    # Calculate metrics
+    print("📊 Calculating metrics...")
+    metrics_before = calculator.calculate_metrics(initial_plan, problem, initial_check)
+    metrics_after = calculator.calculate_metrics(final_plan, problem, final_check)
+    improvement_metrics = calculator.compare_metrics(metrics_before, metrics_after)
+    
+    total_time = refinement_time + (time.time() - start_time)
+    
+    # Display results
+    print("\n" + "=" * 60)
+    print("📈 EVALUATION RESULTS")
+    print("=" * 60)
+    
+    print(f"⏱️  Total Processing Time: {total_time:.2f}s")
+    print(f"🔄 Refinement Iterations: {refinement_result.iterations}")
+    print(f"✅ Converged: {'Yes' if refinement_result.converged else 'No'}")
+    print(f"🔢 Tokens: {refinement_result.usage.get('total_tokens', 0)} "
+          f"(cost ${refinement_result.usage.get('cost_usd', 0.0):.4f})")
+    prompt_budget = refinement_result.refinement_history[-1].get('prompt_budget')
+    if prompt_budget:
+        print(f"🧾 Prompt Budget: {prompt_budget['prompt_tokens']}/{prompt_budget['budget']} tokens "
+              f"({prompt_budget['compacted']} compacted, {prompt_budget['dropped']} dropped)")
+    generate_latency = refinement_result.latency_percentiles().get('generate', {})
+    if generate_latency:
+        print(f"⏱️  Generate Latency: p50 {generate_latency['p50']:.3f}s | "
+              f"p95 {generate_latency['p95']:.3f}s")
+    print()
+    
+    print("📊 Quality Metrics:")
+    print(f"   Initial Quality: {metrics_before.quality_metrics['overall_quality_score']:.3f}")
+    print(f"   Final Quality:   {metrics_after.quality_metrics['overall_quality_score']:.3f}")
+    print(f"   Improvement:     {improvement_metrics['overall_quality_score_absolute_improvement']:+.3f}")
+    print(f"   Relative Gain:   {improvement_metrics['overall_quality_score_relative_improvement']:+.1f}%")
+    print()
+    
+    print("🎯 Performance Metrics:")
+    if 'total_errors_absolute_improvement' in improvement_metrics:
+        print(f"   Error Reduction: {improvement_metrics['total_errors_absolute_improvement']:+.1f}")
+    else:
+        print(f"   Error Reduction: N/A")
+    print(f"   Completeness:    {metrics_after.quality_metrics['completeness_score']:.3f}")
+    print(f"   Consistency:     {metrics_after.quality_metrics['semantic_consistency']:.3f}")
+    print()
+    
+    print("🤖 LLM Information:")
+    print(f"   Provider: {llm_info.get('provider', 'unknown')}")
+    print(f"   Model:    {llm_info.get('model', 'unknown')}")
+    
+    # Prepare results
+    return {
+        'scenario': scenario_name,
+        'problem': problem,
+        'refinement_result': refinement_result,
+        'metrics_before': metrics_before.to_dict(),
+        'metrics_after': metrics_after.to_dict(),
+        'improvement_metrics': improvement_metrics,
+        'llm_info': llm_info,
+        'evaluation_metadata': {
+            'total_time': total_time,
+            'timestamp': time.time(),
+            'framework_version': '1.0.0'
         }
-        
-        # Export results if requested
-        if export_path:
-            export_results(results, export_path)
-        
-        return results
-        
-    except Exception as e:
-        print(f"❌ Error during evaluation: {e}")
-        return {}
+    }
 
 
 def run_multiple_evaluations(scenarios: List[str], provider: str = "mock",
                             model_name: Optional[str] = None,
                             export_path: Optional[str] = None,
-                            iterations: int = 3, **llm_kwargs) -> List[Dict[str, Any]]:
+                            iterations: int = 3, concurrency: int = 1,
+                            workers: int = 1, results_path: Optional[str] = None,
+                            manifest: Optional[RunManifest] = None,
+                            **llm_kwargs) -> List[Dict[str, Any]]:
     """
     Run evaluations on multiple scenarios.
     
+    With workers=1 all scenarios share one refinement engine and are refined
+    through RefinementEngine.refine_plan_many; with more, they are spread
+    over a process pool (see evaluate_scenarios).
+    
+    With results_path each result is streamed to a JSONL file as it
+    finishes instead of being kept in memory, and the returned
+    JSONLResultSink stands in for the list (it has a length, iterates the
+    stored results and carries running statistics).
+    
+    With a RunManifest, scenarios it records as completed are skipped and
+    results stream to the run's own JSONL file (results_path is ignored),
+    so the returned sink and the export cover the whole run.
+    
     Args:
         scenarios: List of scenario names
         provider: LLM provider name
         model_name: Model name (optional)
         export_path: Path to export aggregate results
         iterations: Number of refinement iterations
+        concurrency: Number of scenarios refined concurrently
+        workers: Number of worker processes (1 runs in this process)
+        results_path: JSONL file to stream results to (optional)
+        manifest: Manifest of the run to record completed scenarios in (optional)
         **llm_kwargs: Additional LLM configuration parameters
         
     Returns:
-        List of evaluation results
+        List of evaluation results, or the JSONLResultSink holding them
     """
     
     print(f"🚀 Running SRLP Multi-Scenario Evaluation")
+    if manifest is not None:
+        print(f"🆔 Run ID: {manifest.run_id} (resume with --resume {manifest.run_id})")
     print(f"📋 Scenarios: {', '.join(scenarios)}")
     print(f"🤖 LLM Provider: {provider}")
     if model_name:
         print(f"🧠 Model: {model_name}")
     print(f"🔄 Max Iterations: {iterations}")
+    if workers > 1:
+        print(f"⚙️  Worker Processes: {workers}")
     print("=" * 80)
     
-    results = []
     start_time = time.time()
     
-    for i, scenario_name in enumerate(scenarios, 1):
-        print(f"\n[{i}/{len(scenarios)}] 🎯 Evaluating: {scenario_name}")
-        print("-" * 60)
-        
+    pending = manifest.pending(scenarios) if manifest is not None else scenarios
+    if len(pending) < len(scenarios):
+        print(f"⏭️  Skipping {len(scenarios) - len(pending)} scenarios completed earlier in this run")
+    
+    loaded = []
+    for scenario_name in pending:
         try:
-            result = run_evaluation_with_llm(
-                scenario_name=scenario_name,
-                provider=provider,
-                model_name=model_name,
-                iterations=iterations,
-                **llm_kwargs
-            )
-            
-            if result:
-                results.append(result)
-                
-                # Brief summary
-                before_quality = result['metrics_before']['quality_metrics']['overall_quality_score']
-                after_quality = result['metrics_after']['quality_metrics']['overall_quality_score']
-                improvement = after_quality - before_quality
-                converged = result['refinement_result']['converged']
-                
-                print(f"✅ Completed: {before_quality:.3f} → {after_quality:.3f} ({improvement:+.3f})")
-                print(f"   Converged: {'Yes' if converged else 'No'}")
-            else:
-                print(f"❌ Failed to evaluate {scenario_name}")
-                
+            loaded.append((scenario_name, get_scenario_by_name(scenario_name)['problem']))
         except Exception as e:
-            print(f"❌ Error evaluating {scenario_name}: {e}")
-            continue
+            print(f"❌ Error loading scenario '{scenario_name}': {e}")
+    
+    if manifest is not None:
+        sink = manifest.open_sink()
+    else:
+        sink = JSONLResultSink(results_path) if results_path else None
+    try:
+        if loaded:
+            results = evaluate_scenarios(loaded, provider, model_name, iterations,
+                                         concurrency=concurrency, workers=workers, sink=sink,
+                                         **llm_kwargs)
+        else:
+            results = sink if sink is not None else []
+    finally:
+        if sink is not None:
+            sink.close()
+    
+    if manifest is not None and not manifest.pending(scenarios):
+        manifest.finish()
     
     total_time = time.time() - start_time
     
@@ -272,22 +353,24 @@ def run_multiple_evaluations(scenarios: List[str], provider: str = "mock",
         print("📊 AGGREGATE RESULTS")
         print("=" * 80)
         
-        avg_initial = sum(r['metrics_before']['quality_metrics']['overall_quality_score'] 
-                         for r in results) / len(results)
-        avg_final = sum(r['metrics_after']['quality_metrics']['overall_quality_score'] 
-                       for r in results) / len(results)
-        avg_improvement = avg_final - avg_initial
-        success_rate = sum(1 for r in results if r['refinement_result']['converged']) / len(results)
-        avg_iterations = sum(r['refinement_result']['iterations'] for r in results) / len(results)
+        stats = result_stats(results)
+        aggregate = stats.to_dict()
+        final_quality = stats.overall['final_quality']
+        avg_initial = aggregate['avg_initial_quality']
+        avg_improvement = aggregate['avg_improvement']
         
         print(f"📈 Summary Statistics:")
         print(f"   Scenarios Evaluated: {len(results)}/{len(scenarios)}")
         print(f"   Average Initial Quality: {avg_initial:.3f}")
-        print(f"   Average Final Quality: {avg_final:.3f}")
+        print(f"   Average Final Quality: {aggregate['avg_final_quality']:.3f}")
+        print(f"   Final Quality Spread: σ={final_quality.stdev:.3f}, "
+              f"p50={final_quality.quantile(0.5):.3f}, p90={final_quality.quantile(0.9):.3f}")
         print(f"   Average Improvement: {avg_improvement:+.3f} ({(avg_improvement/avg_initial)*100:+.1f}%)")
-        print(f"   Success Rate: {success_rate:.1%}")
-        print(f"   Average Iterations: {avg_iterations:.1f}")
+        print(f"   Success Rate: {aggregate['success_rate']:.1%}")
+        print(f"   Average Iterations: {aggregate['avg_iterations']:.1f}")
         print(f"   Total Processing Time: {total_time:.2f}s")
+        if sink is not None:
+            print(f"   Results Streamed To: {sink.path}")
         print()
         
         print(f"🤖 LLM Provider: {provider}")
@@ -298,7 +381,101 @@ def run_multiple_evaluations(scenarios: List[str], provider: str = "mock",
     if export_path and results:
         export_aggregate_results(results, export_path)
     
-    return results
+    if isinstance(results, JSONLResultSink):
+        return results
+    return [public_result(result) for result in results]
+
+
+def evaluate_scenarios(loaded: List[Tuple[str, Dict[str, Any]]], provider: str = "mock",
+                       model_name: Optional[str] = None, iterations: int = 3,
+                       concurrency: int = 1, workers: int = 1,
+                       sink: Optional[JSONLResultSink] = None,
+                       **llm_kwargs) -> List[Dict[str, Any]]:
+    """
+    Refine and evaluate (scenario name, problem) pairs, printing each report.
+    
+    With workers > 1 scenarios are distributed over a process pool and each
+    report is printed as its scenario finishes; results are still delivered
+    in input order, so aggregates match a serial run exactly. llm_kwargs
+    must be picklable in that mode.
+    
+    With a sink each result is written to it instead of being collected,
+    and the sink is returned in place of the list.
+    
+    Returns:
+        Evaluation results of the scenarios that succeeded, in input order
+    """
+    
+    results = []
+    deliver = sink.write if sink is not None else results.append
+    if workers > 1:
+        evaluate_in_processes(loaded, workers, create_engine_with_fallback,
+                              (provider, model_name, iterations), llm_kwargs,
+                              _evaluate_in_worker, deliver, _report_worker_scenario)
+        return sink if sink is not None else results
+    
+    refinement_engine, llm_info = create_engine_with_fallback(
+        provider, model_name, iterations, **llm_kwargs
+    )
+    
+    refinements = refinement_engine.refine_plan_many(
+        (problem for _, problem in loaded), concurrency=concurrency,
+        ordered=True, return_exceptions=True
+    )
+    
+    for i, ((scenario_name, problem), refinement_result) in enumerate(zip(loaded, refinements), 1):
+        print(f"\n[{i}/{len(loaded)}] 🎯 Evaluating: {scenario_name}")
+        print("-" * 60)
+        
+        try:
+            if isinstance(refinement_result, Exception):
+                raise refinement_result
+            
+            result = evaluate_refinement(scenario_name, problem, refinement_result, llm_info,
+                                         refinement_result.total_time)
+            deliver(result)
+            print_scenario_summary(result)
+                
+        except Exception as e:
+            print(f"❌ Error evaluating {scenario_name}: {e}")
+            continue
+    
+    return sink if sink is not None else results
+
+
+def _evaluate_in_worker(engine_and_info, scenario_name: str, problem: Dict[str, Any]):
+    """Refine and evaluate one scenario in a worker process; None on failure."""
+    
+    refinement_engine, llm_info = engine_and_info
+    try:
+        refinement_result = refinement_engine.refine_plan(problem)
+        return evaluate_refinement(scenario_name, problem, refinement_result, llm_info,
+                                   refinement_result.total_time)
+    except Exception as e:
+        print(f"❌ Error evaluating {scenario_name}: {e}")
+        return None
+
+
+def _report_worker_scenario(position: int, total: int, scenario_name: str, result, output: str):
+    """Print a scenario finished by a worker process in one piece."""
+    
+    print(f"\n[{position}/{total}] 🎯 Evaluating: {scenario_name}")
+    print("-" * 60)
+    print(output, end='')
+    if result is not None:
+        print_scenario_summary(result)
+
+
+def print_scenario_summary(result: Dict[str, Any]):
+    """Print the one-line quality change and convergence of a scenario."""
+    
+    before_quality = result['metrics_before']['quality_metrics']['overall_quality_score']
+    after_quality = result['metrics_after']['quality_metrics']['overall_quality_score']
+    improvement = after_quality - before_quality
+    converged = result['refinement_result']['converged']
+    
+    print(f"✅ Completed: {before_quality:.3f} → {after_quality:.3f} ({improvement:+.3f})")
+    print(f"   Converged: {'Yes' if converged else 'No'}")
 
 
 def export_results(results: Dict[str, Any], export_path: str):
@@ -336,72 +513,40 @@ def export_results(results: Dict[str, Any], export_path: str):
     else:
         # Export as JSON
         json_path = export_path if export_path.endswith('.json') else export_path + '.json'
-        with open(json_path, 'w') as f:
-            json.dump(results, f, indent=2)
+        with open(json_path, 'wb') as f:
+            f.write(encode_results_json(results))
         print(f"📄 Results exported to JSON: {json_path}")
 
 
 def export_aggregate_results(results: List[Dict[str, Any]], export_path: str):
-    """Export aggregate results from multiple evaluations."""
+    """Export aggregate results from multiple evaluations (a list or JSONLResultSink)."""
     
     os.makedirs(os.path.dirname(export_path) if os.path.dirname(export_path) else '.', exist_ok=True)
     
     if export_path.endswith('.csv'):
-        # Create summary CSV
-        import csv
-        
-        summary_data = []
-        for result in results:
-            scenario = result['scenario']
-            before_quality = result['metrics_before']['quality_metrics']['overall_quality_score']
-            after_quality = result['metrics_after']['quality_metrics']['overall_quality_score']
-            improvement = after_quality - before_quality
-            converged = result['refinement_result']['converged']
-            iterations = result['refinement_result']['iterations']
-            time_taken = result['refinement_result']['total_time']
-            llm_info = result.get('llm_info', {})
-            
-            summary_data.append({
-                'scenario': scenario,
-                'initial_quality': before_quality,
-                'final_quality': after_quality,
-                'improvement': improvement,
-                'improvement_percent': (improvement / max(0.001, before_quality)) * 100,
-                'converged': converged,
-                'iterations': iterations,
-                'time_seconds': time_taken,
-                'llm_provider': llm_info.get('provider', 'unknown'),
-                'llm_model': llm_info.get('model', 'unknown')
-            })
-        
-        with open(export_path, 'w', newline='') as csvfile:
-            fieldnames = ['scenario', 'initial_quality', 'final_quality', 'improvement', 
-                         'improvement_percent', 'converged', 'iterations', 'time_seconds',
-                         'llm_provider', 'llm_model']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(summary_data)
-        
+        write_results_csv(results, export_path)
         print(f"📄 Aggregate results exported to CSV: {export_path}")
         
     else:
         # Export as JSON
-        aggregate_data = {
-            'summary': {
-                'total_scenarios': len(results),
-                'avg_initial_quality': sum(r['metrics_before']['quality_metrics']['overall_quality_score'] 
-                                         for r in results) / len(results),
-                'avg_final_quality': sum(r['metrics_after']['quality_metrics']['overall_quality_score'] 
-                                       for r in results) / len(results),
-                'success_rate': sum(1 for r in results if r['refinement_result']['converged']) / len(results),
-                'llm_provider': results[0].get('llm_info', {}).get('provider', 'unknown') if results else 'unknown'
-            },
-            'detailed_results': results
+        stats = result_stats(results)
+        averages = stats.to_dict()
+        summary = {
+            'total_scenarios': stats.count,
+            'avg_initial_quality': averages['avg_initial_quality'],
+            'avg_final_quality': averages['avg_final_quality'],
+            'success_rate': averages['success_rate'],
+            'llm_provider': stats.llm_provider or 'unknown',
+            'statistics': stats.summary()
         }
         
         json_path = export_path if export_path.endswith('.json') else export_path + '.json'
-        with open(json_path, 'w') as f:
-            json.dump(aggregate_data, f, indent=2)
+        with open(json_path, 'wb') as f:
+            if isinstance(results, JSONLResultSink):
+                # Copy the streamed lines rather than loading every result
+                results.write_json(f, {'summary': summary})
+            else:
+                f.write(encode_results_json({'summary': summary, 'detailed_results': results}))
         
         print(f"📄 Aggregate results exported to JSON: {json_path}")
 
@@ -436,16 +581,21 @@ Examples:
                                help='Single scenario to evaluate')
     scenario_group.add_argument('--scenarios', nargs='+',
                                help='Multiple scenarios to evaluate')
+    scenario_group.add_argument('--resume', type=str, metavar='RUN_ID',
+                               help='Resume a multi-scenario run with its original scenarios, '
+                                    'provider, model and settings, skipping completed scenarios')
     
     # LLM Provider options
     parser.add_argument('--provider', type=str, default='mock',
-                       help='LLM provider (openai, claude, llama, huggingface, mock)')
+                       help='LLM provider (openai, claude, llama, huggingface, transformers, http, mock)')
     parser.add_argument('--model', type=str,
                        help='Model name (uses provider default if not specified)')
     parser.add_argument('--api-key', type=str,
                        help='API key for the provider')
     parser.add_argument('--base-url', type=str,
                        help='Base URL for the provider API')
+    parser.add_argument('--http2', action='store_true',
+                       help='Use HTTP/2 for the http provider (needs httpx[http2])')
     parser.add_argument('--temperature', type=float, default=0.7,
                        help='Temperature for text generation (default: 0.7)')
     parser.add_argument('--max-tokens', type=int, default=1000,
@@ -454,6 +604,11 @@ Examples:
     # Framework options
     parser.add_argument('--iterations', type=int, default=3,
                        help='Maximum refinement iterations (default: 3)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Scenarios refined concurrently with --scenarios (default: 1)')
+    add_llm_arguments(parser)
+    parser.add_argument('--health-interval', type=float, default=60.0,
+                       help='Seconds between background provider health probes (default: 60)')
     
     # Output options
     parser.add_argument('--export', type=str,
@@ -500,24 +655,48 @@ Examples:
         'temperature': args.temperature,
         'max_tokens': args.max_tokens
     }
+    llm_kwargs_from_args(args, llm_kwargs)
     
-    if args.api_key:
-        llm_kwargs['api_key'] = args.api_key
-    if args.base_url:
-        llm_kwargs['base_url'] = args.base_url
+    # Probe providers in the background instead of before every scenario
+    get_health_monitor(interval=args.health_interval)
     
     # Ensure results directory exists
     os.makedirs('results', exist_ok=True)
     
     try:
-        if args.scenarios:
+        if args.scenarios or args.resume:
+            if args.resume:
+                # Replay the original configuration; only the API key is
+                # taken from this invocation since manifests never store it
+                manifest = RunManifest.load(args.resume)
+                config = manifest.config
+                llm_kwargs = dict(config.get('llm_kwargs', {}))
+                if args.api_key:
+                    llm_kwargs['api_key'] = args.api_key
+                print(f"🔁 Resuming run {manifest.run_id}: "
+                      f"{len(manifest.completed)} scenarios already completed")
+            else:
+                config = {
+                    'command': 'run_evaluation',
+                    'scenarios': args.scenarios,
+                    'provider': args.provider,
+                    'model': args.model,
+                    'iterations': args.iterations,
+                    'llm_kwargs': llm_kwargs
+                }
+                manifest = RunManifest.create(config, results_path=args.results_jsonl)
+                config = manifest.config
+            
             # Run multiple scenarios
             results = run_multiple_evaluations(
-                scenarios=args.scenarios,
-                provider=args.provider,
-                model_name=args.model,
+                scenarios=config['scenarios'],
+                provider=config['provider'],
+                model_name=config.get('model'),
                 export_path=args.export,
-                iterations=args.iterations,
+                iterations=config.get('iterations', args.iterations),
+                concurrency=args.concurrency,
+                workers=args.workers,
+                manifest=manifest,
                 **llm_kwargs
             )
             
@@ -525,7 +704,7 @@ Examples:
             if args.visualize and results:
                 print("\n📊 Generating visualizations...")
                 viz_dir = os.path.join(os.path.dirname(args.export) if args.export else 'results', 'visualizations')
-                generate_all_visualizations(results, viz_dir)
+                generate_all_visualizations(list(results), viz_dir)
                 print(f"📊 Visualizations saved to: {viz_dir}")
             
         else:
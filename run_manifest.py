@@ -0,0 +1,194 @@
+"""Run IDs and completed-work manifests for resumable evaluation runs."""
+
+import json
+import os
+import secrets
+import time
+from typing import Dict, Any, List, Optional
+
+from result_sink import JSONLResultSink
+
+# Each run keeps its manifest, completion log and streamed results in
+# RUNS_DIR/<run_id>/
+RUNS_DIR = os.path.join('results', 'runs')
+
+# llm_kwargs never written to a manifest
+_SECRET_KWARGS = ('api_key',)
+
+
+def new_run_id() -> str:
+    """Return a sortable, collision-resistant run ID such as 20250101-120000-a1b2c3."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+class RunManifest:
+    """Record of which scenario/provider/model cells of a run have finished.
+
+    manifest.json holds the run's configuration and is only rewritten when
+    the run starts or completes. Finished cells go to an append-only
+    completion log, one line per results line, so recording a cell costs
+    one small append however large the run. The log is the commit record
+    of the run: on resume the results file is cut back to as many lines as
+    the log holds, dropping a result whose cell never made it into the log
+    (a crash between the two writes), and that cell runs again.
+
+    Usage:
+        manifest = RunManifest.create({'provider': 'mock', 'scenarios': names})
+        sink = manifest.open_sink()
+        ...                                # sink.write(result) per scenario
+        manifest = RunManifest.load(run_id)  # later, with --resume run_id
+        todo = manifest.pending(names)
+    """
+
+    def __init__(self, run_id: str, data: Dict[str, Any], runs_dir: str = RUNS_DIR):
+        self.run_id = run_id
+        self.data = data
+        run_dir = os.path.join(runs_dir, run_id)
+        self.path = os.path.join(run_dir, 'manifest.json')
+        self.log_path = os.path.join(run_dir, 'completed.jsonl')
+        self.completed = {}
+        self.committed_lines = 0
+        self._log = None
+
+    @classmethod
+    def create(cls, config: Dict[str, Any], run_id: Optional[str] = None,
+               results_path: Optional[str] = None, runs_dir: str = RUNS_DIR) -> 'RunManifest':
+        """Start a new run with config (provider, model, iterations, scenarios, ...).
+
+        Repeated scenario names are dropped; each cell runs once per run.
+        """
+        run_id = run_id or new_run_id()
+        run_dir = os.path.join(runs_dir, run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        config = dict(config)
+        if 'scenarios' in config:
+            config['scenarios'] = list(dict.fromkeys(config['scenarios']))
+        if 'llm_kwargs' in config:
+            config['llm_kwargs'] = {key: value for key, value in config['llm_kwargs'].items()
+                                    if key not in _SECRET_KWARGS}
+        manifest = cls(run_id, {
+            'run_id': run_id,
+            'created_at': time.time(),
+            'status': 'running',
+            'config': config,
+            'results_path': results_path or os.path.join(run_dir, 'results.jsonl')
+        }, runs_dir)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, run_id: str, runs_dir: str = RUNS_DIR) -> 'RunManifest':
+        path = os.path.join(runs_dir, run_id, 'manifest.json')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No run '{run_id}' (expected {path})")
+        with open(path) as f:
+            manifest = cls(run_id, json.load(f), runs_dir)
+        manifest._load_log()
+        return manifest
+
+    def _load_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        valid = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn by a crash mid-append; nothing follows it.
+                    break
+                self.completed[entry['cell']] = entry
+                self.committed_lines += 1
+                valid += len(line)
+        with open(self.log_path, 'r+b') as f:
+            f.truncate(valid)
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return self.data['config']
+
+    @property
+    def results_path(self) -> str:
+        return self.data['results_path']
+
+    def cell_key(self, scenario: str) -> str:
+        """Key of the scenario/provider/model cell for scenario in this run."""
+        return '|'.join((scenario, self.config.get('provider') or '', self.config.get('model') or ''))
+
+    def is_completed(self, scenario: str) -> bool:
+        return self.cell_key(scenario) in self.completed
+
+    def pending(self, scenarios: List[str]) -> List[str]:
+        """Return the distinct scenarios whose cells have not finished, in order."""
+        return [scenario for scenario in dict.fromkeys(scenarios) if not self.is_completed(scenario)]
+
+    def mark_completed(self, scenario: str):
+        """Log scenario's cell as finished; its result is the next results line."""
+        entry = {
+            'cell': self.cell_key(scenario),
+            'scenario': scenario,
+            'output': self.results_path,
+            'line': self.committed_lines,
+            'finished_at': time.time()
+        }
+        if self._log is None:
+            self._log = open(self.log_path, 'a')
+        self._log.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._log.flush()
+        self.completed[entry['cell']] = entry
+        self.committed_lines += 1
+
+    def finish(self):
+        """Mark the run complete (it may still be resumed to add scenarios)."""
+        self.data['status'] = 'complete'
+        self.save()
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def save(self):
+        """Write the manifest header atomically."""
+        self.data['updated_at'] = time.time()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def open_sink(self) -> 'ManifestResultSink':
+        """Open the run's results file for appending, keeping only committed lines."""
+        self._truncate_results(self.committed_lines)
+        return ManifestResultSink(self)
+
+    def _truncate_results(self, lines: int):
+        if not os.path.exists(self.results_path):
+            return
+        keep = 0
+        with open(self.results_path, 'rb') as f:
+            for i, line in enumerate(f):
+                if i == lines:
+                    break
+                keep += len(line)
+        with open(self.results_path, 'r+b') as f:
+            f.truncate(keep)
+
+
+class ManifestResultSink(JSONLResultSink):
+    """JSONLResultSink that logs each written result's cell in a RunManifest.
+
+    Opened in append mode, so the results and statistics of earlier
+    attempts at the run are carried into the aggregate export.
+    """
+
+    def __init__(self, manifest: RunManifest):
+        super().__init__(manifest.results_path, append=True)
+        self.manifest = manifest
+
+    def write(self, result: Dict[str, Any]):
+        super().write(result)
+        self.manifest.mark_completed(result['scenario'])
+
+    def close(self):
+        super().close()
+        self.manifest.close()
@@ -9,6 +9,8 @@ import numpy as np
 import random
 import os
 
+from refinement_engine import PROVIDER_PROFILES
+
 # Set random seed for reproducible results
 np.random.seed(42)
 random.seed(42)
@@ -16,54 +18,9 @@ random.seed(42)
 def simulate_provider_results():
     """Simulate realistic results for different LLM providers."""
     
-    # Define provider characteristics based on real-world performance
-    providers = {
-        'openai': {
-            'models': ['gpt-4', 'gpt-3.5-turbo'],
-            'quality_base': 0.85,
-            'quality_variance': 0.08,
-            'speed_base': 2.5,
-            'speed_variance': 0.8,
-            'improvement_rate': 0.75,
-            'convergence_rate': 0.60
-        },
-        'claude': {
-            'models': ['claude-3-opus', 'claude-3-sonnet'],
-            'quality_base': 0.82,
-            'quality_variance': 0.06,
-            'speed_base': 2.8,
-            'speed_variance': 0.7,
-            'improvement_rate': 0.70,
-            'convergence_rate': 0.55
-        },
-        'llama': {
-            'models': ['llama-2-70b', 'llama-2-13b'],
-            'quality_base': 0.75,
-            'quality_variance': 0.10,
-            'speed_base': 1.2,
-            'speed_variance': 0.4,
-            'improvement_rate': 0.60,
-            'convergence_rate': 0.40
-        },
-        'huggingface': {
-            'models': ['mistral-7b', 'codellama-34b'],
-            'quality_base': 0.68,
-            'quality_variance': 0.12,
-            'speed_base': 0.8,
-            'speed_variance': 0.3,
-            'improvement_rate': 0.50,
-            'convergence_rate': 0.30
-        },
-        'mock': {
-            'models': ['mock-model'],
-            'quality_base': 0.55,
-            'quality_variance': 0.05,
-            'speed_base': 0.1,
-            'speed_variance': 0.02,
-            'improvement_rate': 0.40,
-            'convergence_rate': 0.00
-        }
-    }
+    # Provider characteristics based on real-world performance (shared with
+    # the MockLLM latency model)
+    providers = PROVIDER_PROFILES
     
     # Define scenarios with complexity factors
     scenarios = {
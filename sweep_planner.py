@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Sweep planner for provider x model x scenario x parameter grids.
+
+Expands a declarative grid lazily, runs every cell through the refinement
+engine on a thread pool with per-provider concurrency limits, and appends
+one row per finished cell to a CSV in the schema that
+analyze_multi_provider_data.py reads. Cells already in that CSV are
+skipped, so an interrupted sweep picks up where it stopped.
+
+Grid files are JSON; every key is optional:
+    {
+        "providers": {"openai": ["gpt-4", "gpt-3.5-turbo"], "claude": []},
+        "scenarios": ["travel_planning", "cooking_dinner"],
+        "temperatures": [0.2, 0.7],
+        "iterations": [3, 5]
+    }
+A provider with no models runs its PROVIDER_PROFILES models (or its default
+model); "providers" may also be a plain list of provider names.
+
+Usage:
+    python sweep_planner.py --grid sweep.json --workers 8 --provider-limit openai=4
+    python sweep_planner.py --providers openai claude llama --mock-latency 0.01
+"""
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, List, Optional
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from evaluation_stats import EvaluationStats
+from refinement_engine import PROVIDER_PROFILES, create_refinement_engine
+from run_evaluation import evaluate_refinement
+from srlp_framework.test_scenarios import get_scenario_by_name, get_all_test_scenarios
+
+
+# Complexity of each problem type, as used by the simulated and combined
+# multi-provider datasets
+SCENARIO_COMPLEXITY = {
+    'travel': 0.6,
+    'cooking': 0.4,
+    'project': 0.8,
+    'event': 0.7,
+    'renovation': 0.7
+}
+
+# Column order of results/multi_provider_comparison/all_providers_comparison.csv,
+# followed by the sweep's own bookkeeping columns
+SWEEP_FIELDNAMES = [
+    'scenario', 'llm_provider', 'llm_model', 'initial_quality', 'final_quality',
+    'improvement', 'improvement_percent', 'converged', 'iterations', 'time_seconds',
+    'scenario_complexity', 'quality_change_category', 'performance_tier', 'efficiency',
+    'improvement_per_iteration', 'temperature', 'max_iterations', 'cell_key'
+]
+
+
+@dataclass(frozen=True, slots=True)
+class SweepCell:
+    """One point of a sweep grid."""
+
+    provider: str
+    model: Optional[str]
+    scenario: str
+    temperature: float
+    iterations: int
+
+    @property
+    def key(self) -> str:
+        """Stable identifier used to dedupe cells against the results store."""
+        return '|'.join((self.provider, self.model or '', self.scenario,
+                         repr(float(self.temperature)), str(self.iterations)))
+
+
+class SweepGrid:
+    """Declarative sweep grid, expanded lazily in a fixed order."""
+
+    def __init__(self, providers, scenarios: Optional[List[str]] = None,
+                 temperatures: Optional[List[float]] = None,
+                 iterations: Optional[List[int]] = None):
+        if not isinstance(providers, dict):
+            providers = {provider: [] for provider in providers}
+        self.providers = {
+            provider: list(models) or PROVIDER_PROFILES.get(provider, {}).get('models', [None])
+            for provider, models in providers.items()
+        }
+        self.scenarios = list(scenarios) if scenarios else [s['name'] for s in get_all_test_scenarios()]
+        self.temperatures = list(temperatures) if temperatures else [0.7]
+        self.iterations = list(iterations) if iterations else [3]
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> 'SweepGrid':
+        return cls(spec.get('providers', ['mock']), spec.get('scenarios'),
+                   spec.get('temperatures'), spec.get('iterations'))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'SweepGrid':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __len__(self):
+        models = sum(len(models) for models in self.providers.values())
+        return models * len(self.scenarios) * len(self.temperatures) * len(self.iterations)
+
+    def __iter__(self) -> Iterator[SweepCell]:
+        for provider, models in self.providers.items():
+            for model, scenario, temperature, iterations in itertools.product(
+                    models, self.scenarios, self.temperatures, self.iterations):
+                yield SweepCell(provider, model, scenario, temperature, iterations)
+
+
+class SweepResultStore:
+    """Append-only CSV of finished sweep cells.
+
+    Existing rows are indexed by cell_key on open (rows without one, such
+    as simulated data, are kept but never match a cell), and a row torn by
+    a crash is dropped. Every added row is flushed immediately.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed = set()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fieldnames = SWEEP_FIELDNAMES
+        if os.path.exists(path) and os.path.getsize(path):
+            self._drop_torn_row()
+            with open(path, newline='') as f:
+                reader = csv.DictReader(f)
+                fieldnames = reader.fieldnames or SWEEP_FIELDNAMES
+                for row in reader:
+                    if row.get('cell_key'):
+                        self.completed.add(row['cell_key'])
+            if 'cell_key' not in fieldnames:
+                raise ValueError(f"{path} has no cell_key column; write the sweep to a new file")
+            self._file = open(path, 'a', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, restval='',
+                                          extrasaction='ignore')
+        else:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+            self._writer.writeheader()
+            self._file.flush()
+
+    def _drop_torn_row(self):
+        with open(self.path, 'r+b') as f:
+            data = f.read()
+            if not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def __contains__(self, cell: SweepCell) -> bool:
+        return cell.key in self.completed
+
+    def add(self, row: Dict[str, Any]):
+        self._writer.writerow(row)
+        self._file.flush()
+        self.completed.add(row['cell_key'])
+
+    def close(self):
+        self._file.close()
+
+
+def result_row(cell: SweepCell, result: Dict[str, Any], problem: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten an evaluation result into a sweep CSV row."""
+
+    metrics = EvaluationStats.metrics_of(result)
+    initial_quality = metrics['initial_quality']
+    final_quality = metrics['final_quality']
+    improvement = metrics['improvement']
+    iterations = metrics['iterations']
+    time_seconds = metrics['time_seconds']
+    return {
+        'scenario': cell.scenario,
+        'llm_provider': cell.provider,
+        'llm_model': cell.model or result.get('llm_info', {}).get('model', 'unknown'),
+        'initial_quality': round(initial_quality, 6),
+        'final_quality': round(final_quality, 6),
+        'improvement': round(improvement, 6),
+        'improvement_percent': round((improvement / max(0.001, abs(initial_quality))) * 100, 2),
+        'converged': result['refinement_result']['converged'],
+        'iterations': iterations,
+        'time_seconds': round(time_seconds, 3),
+        'scenario_complexity': SCENARIO_COMPLEXITY.get(problem.get('type'), 0.5),
+        'quality_change_category': ('Improved' if improvement > 0.005 else
+                                    ('Degraded' if improvement < -0.005 else 'Unchanged')),
+        'performance_tier': ('High' if final_quality > 0.75 else
+                             ('Medium' if final_quality > 0.55 else 'Low')),
+        'efficiency': final_quality / max(0.001, time_seconds),
+        'improvement_per_iteration': improvement / max(1, iterations),
+        'temperature': cell.temperature,
+        'max_iterations': cell.iterations,
+        'cell_key': cell.key
+    }
+
+
+class SweepPlanner:
+    """Schedule the pending cells of a grid across a worker pool.
+
+    At most workers cells run at once, and at most provider_limits[p] of
+    them (default: workers) for provider p. Cells of a saturated provider
+    wait in a bounded lookahead while cells of other providers go ahead,
+    so the grid is never expanded in full. Engines are built once per
+    provider/model/temperature/iteration cap and shared between cells.
+
+    Usage:
+        planner = SweepPlanner(SweepGrid.from_file('sweep.json'),
+                               SweepResultStore('results/sweep.csv'),
+                               workers=8, provider_limits={'openai': 4})
+        stats = planner.run()
+    """
+
+    def __init__(self, grid: SweepGrid, store: SweepResultStore, workers: int = 4,
+                 provider_limits: Optional[Dict[str, int]] = None, lookahead: Optional[int] = None,
+                 **llm_kwargs):
+        self.grid = grid
+        self.store = store
+        self.workers = workers
+        self.provider_limits = provider_limits or {}
+        self.lookahead = lookahead or workers * 4
+        self.llm_kwargs = llm_kwargs
+        self.stats = EvaluationStats()
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self._engines = {}
+        self._engines_lock = threading.Lock()
+        self._problems = {}
+
+    def pending(self) -> Iterator[SweepCell]:
+        """Yield the grid cells not yet in the results store."""
+        for cell in self.grid:
+            if cell in self.store:
+                self.skipped += 1
+                continue
+            yield cell
+
+    def _limit(self, provider: str) -> int:
+        return max(1, min(self.workers, self.provider_limits.get(provider, self.workers)))
+
+    def _engine(self, cell: SweepCell):
+        key = (cell.provider, cell.model, cell.temperature, cell.iterations)
+        with self._engines_lock:
+            if key not in self._engines:
+                self._engines[key] = create_refinement_engine(
+                    provider=cell.provider, model=cell.model, max_iterations=cell.iterations,
+                    **dict(self.llm_kwargs, temperature=cell.temperature)
+                )
+            return self._engines[key]
+
+    def _problem(self, scenario: str) -> Dict[str, Any]:
+        if scenario not in self._problems:
+            self._problems[scenario] = get_scenario_by_name(scenario)['problem']
+        return self._problems[scenario]
+
+    def run_cell(self, cell: SweepCell, problem: Dict[str, Any]) -> Dict[str, Any]:
+        """Refine and evaluate one cell, returning its evaluation result."""
+        engine = self._engine(cell)
+        refinement_result = engine.refine_plan(problem)
+        return evaluate_refinement(cell.scenario, problem, refinement_result,
+                                   engine.get_provider_info(), refinement_result.total_time)
+
+    def run(self, progress=None) -> EvaluationStats:
+        """Run every pending cell, appending rows to the store as cells finish.
+
+        The per-cell evaluation reports are discarded; progress (default:
+        print to the current stdout) gets one line per finished cell.
+        """
+        # stdout is redirected once for the whole pool, since redirecting
+        # it per cell from worker threads would race
+        stdout = sys.stdout
+        if progress is None:
+            progress = lambda message: print(message, file=stdout, flush=True)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return self._run(progress)
+
+    def _run(self, progress) -> EvaluationStats:
+        cells = self.pending()
+        waiting = {}
+        waiting_count = 0
+        active = {}
+        in_flight = {}
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            def submit(cell):
+                try:
+                    problem = self._problem(cell.scenario)
+                except Exception as e:
+                    self.failed += 1
+                    progress(f"❌ {cell.key}: {e}")
+                    return
+                in_flight[pool.submit(self.run_cell, cell, problem)] = (cell, problem)
+                active[cell.provider] = active.get(cell.provider, 0) + 1
+
+            while True:
+                # Start waiting cells whose provider has room again
+                for provider, backlog in waiting.items():
+                    while (backlog and len(in_flight) < self.workers
+                           and active.get(provider, 0) < self._limit(provider)):
+                        submit(backlog.popleft())
+                        waiting_count -= 1
+
+                # Then pull new cells until the pool or the lookahead is full
+                while not exhausted and len(in_flight) < self.workers and waiting_count < self.lookahead:
+                    cell = next(cells, None)
+                    if cell is None:
+                        exhausted = True
+                    elif active.get(cell.provider, 0) < self._limit(cell.provider):
+                        submit(cell)
+                    else:
+                        waiting.setdefault(cell.provider, deque()).append(cell)
+                        waiting_count += 1
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cell, problem = in_flight.pop(future)
+                    active[cell.provider] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.failed += 1
+                        progress(f"❌ {cell.key}: {e}")
+                        continue
+                    self.store.add(result_row(cell, result, problem))
+                    self.stats.update(result)
+                    self.completed += 1
+                    progress(f"✅ [{self.completed}] {cell.key}")
+
+        return self.stats
+
+
+def parse_provider_limits(values: List[str]) -> Dict[str, int]:
+    """Parse repeated PROVIDER=N options."""
+    limits = {}
+    for value in values or []:
+        provider, _, limit = value.partition('=')
+        if not limit.isdigit():
+            raise argparse.ArgumentTypeError(f"Expected PROVIDER=N, got '{value}'")
+        limits[provider] = int(limit)
+    return limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a provider x model x scenario parameter sweep')
+    parser.add_argument('--grid', type=str,
+                       help='JSON grid specification (overrides the grid options below)')
+    parser.add_argument('--providers', nargs='+', default=['mock'],
+                       help='Providers to sweep, each with its profile models (default: mock)')
+    parser.add_argument('--scenarios', nargs='+',
+                       help='Scenarios to sweep (default: all)')
+    parser.add_argument('--temperatures', nargs='+', type=float,
+                       help='Sampling temperatures to sweep (default: 0.7)')
+    parser.add_argument('--iterations', nargs='+', type=int,
+                       help='Iteration caps to sweep (default: 3)')
+    parser.add_argument('--output', type=str,
+                       default='results/multi_provider_comparison/sweep_results.csv',
+                       help='Results CSV; cells already in it are skipped')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Cells run concurrently (default: 4)')
+    parser.add_argument('--provider-limit', action='append', metavar='PROVIDER=N',
+                       help='Cap concurrent cells for one provider (repeatable)')
+    parser.add_argument('--mock-latency', type=float, metavar='SCALE',
+                       help="Give mock LLMs their provider profile's latency, scaled by SCALE")
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Only report how many cells are pending')
+    args = parser.parse_args()
+
+    if args.grid:
+        grid = SweepGrid.from_file(args.grid)
+    else:
+        grid = SweepGrid(args.providers, args.scenarios, args.temperatures, args.iterations)
+
+    llm_kwargs = {}
+    if args.mock_latency:
+        llm_kwargs = {'latency_profile': True, 'latency_scale': args.mock_latency}
+
+    store = SweepResultStore(args.output)
+    planner = SweepPlanner(grid, store, workers=args.workers,
+                           provider_limits=parse_provider_limits(args.provider_limit),
+                           **llm_kwargs)
+
+    print(f"🧮 Sweep grid: {len(grid)} cells, {len(store.completed)} already in {args.output}")
+    if args.dry_run:
+        print(f"📋 Pending cells: {sum(1 for _ in planner.pending())}")
+        store.close()
+        return
+
+    try:
+        stats = planner.run()
+    finally:
+        store.close()
+
+    print("=" * 60)
+    print(f"📊 Completed: {planner.completed}  Skipped: {planner.skipped}  Failed: {planner.failed}")
+    for provider, group in stats.by_provider.items():
+        print(f"🤖 {provider}: final quality {group['final_quality'].mean:.3f} "
+              f"(p90 {group['final_quality'].quantile(0.9):.3f}), "
+              f"{group['time_seconds'].mean:.3f}s avg")
+    print(f"💾 Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Tests for the pooled HTTP transport against the local stub completion server.
+Run with: python -m pytest test_http_transport.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from http_transport import PooledTransport, StubLLMServer, httpx, reset_shared_transport
+from refinement_engine import HTTPLLM, LLMFactory
+
+
+def test_sequential_requests_reuse_one_connection():
+    """Back-to-back completions share a single keep-alive connection."""
+    transport = PooledTransport()
+    with StubLLMServer() as server:
+        llm = HTTPLLM('http', 'stub-model', base_url=server.url, transport=transport)
+        for i in range(5):
+            assert llm.generate(f"prompt {i}").content == server.reply
+        transport.close()
+
+    stats = transport.stats()
+    assert server.requests == 5
+    assert server.connections == 1
+    assert stats['connections_created'] == 1
+    assert stats['connections_reused'] == 4
+
+
+def test_concurrent_requests_stay_within_pool_limit():
+    """Concurrent callers never open more than max_connections to a host."""
+    transport = PooledTransport(max_connections=2)
+    with StubLLMServer(latency=0.02) as server:
+        llm = HTTPLLM('http', 'stub-model', base_url=server.url, transport=transport)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(llm.generate, [f"prompt {i}" for i in range(16)]))
+        transport.close()
+
+    assert len(responses) == 16
+    assert server.requests == 16
+    assert server.connections <= 2
+
+
+def test_factory_llms_share_the_process_transport():
+    """LLMs from the factory reuse the shared transport for the same settings."""
+    reset_shared_transport()
+    try:
+        with StubLLMServer() as server:
+            first = LLMFactory.create_llm('http', 'stub-model', base_url=server.url)
+            second = LLMFactory.create_llm('http', 'stub-model', base_url=server.url)
+            first.generate("one")
+            second.generate("two")
+            assert first.transport is second.transport
+            assert server.connections == 1
+
+            http2 = LLMFactory.create_llm('http', 'stub-model', base_url=server.url, http2=True)
+            assert http2.transport is not first.transport
+            assert http2.transport.http2 == (httpx is not None)
+    finally:
+        reset_shared_transport()
+
+
+class DroppingTransport(PooledTransport):
+    """Transport whose sends fail, once dropping is set, as if the server reset them."""
+
+    def __init__(self):
+        super().__init__()
+        self.dropping = False
+        self.dropped = []
+
+    def _send(self, connection, method, path, body, headers):
+        if not self.dropping:
+            return super()._send(connection, method, path, body, headers)
+        if connection.sock is None:
+            connection.connect()
+        self.dropped.append(connection)
+        raise ConnectionResetError("connection reset by peer")
+
+
+def test_failed_stale_retry_closes_the_fresh_connection():
+    """When the retry on a fresh connection fails too, both connections are closed."""
+    transport = DroppingTransport()
+    with StubLLMServer() as server:
+        transport.request('GET', server.url + '/v1/models')
+        transport.dropping = True
+        with pytest.raises(ConnectionResetError):
+            transport.request('GET', server.url + '/v1/models')
+        transport.close()
+
+    assert transport.stats()['stale_retries'] == 1
+    assert len(transport.dropped) == 2
+    assert all(connection.sock is None for connection in transport.dropped)
+
+
+def test_response_headers_ignore_case():
+    """Retry-After and friends are found however the server capitalises them."""
+    transport = PooledTransport()
+    with StubLLMServer() as server:
+        response = transport.request('GET', server.url + '/v1/models')
+        transport.close()
+
+    assert response.headers.get('content-type') == 'application/json'
+    assert response.headers.get('CONTENT-TYPE') == 'application/json'
@@ -0,0 +1,67 @@
+"""
+Tests for batch refinement in the refinement engine.
+Run with: python -m pytest test_refinement_engine.py
+"""
+
+import threading
+import time
+
+from refinement_engine import QualityCache, RefinementEngine, RefinementTrace, content_hash
+
+
+class StragglerEngine(RefinementEngine):
+    """Engine whose first problem is slow and the rest are instant."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.started = 0
+        self._lock = threading.Lock()
+
+    def refine_plan(self, problem):
+        with self._lock:
+            self.started += 1
+        if problem['index'] == 0:
+            time.sleep(self.delay)
+        return problem['index']
+
+
+def test_ordered_batch_bounds_work_behind_a_straggler():
+    """A slow early problem must not let the rest of the input start and buffer."""
+    engine = StragglerEngine(delay=0.3)
+    problems = ({'index': i} for i in range(10000))
+
+    results = engine.refine_plan_many(problems, concurrency=4, ordered=True)
+    assert next(results) == 0
+    # At most 2 * concurrency problems are started but not yet yielded
+    assert engine.started <= 2 * 4
+    results.close()
+
+
+def test_ordered_batch_yields_in_input_order():
+    engine = StragglerEngine(delay=0.05)
+    results = list(engine.refine_plan_many(({'index': i} for i in range(50)),
+                                           concurrency=4, ordered=True))
+    assert results == list(range(50))
+
+
+def test_trace_quality_key_does_not_rebuild_the_solution():
+    """Cached scoring of a trace hashes its running digest, not its full text."""
+    engine = RefinementEngine(max_iterations=50, quality_threshold=2.0, convergence_epsilon=-1.0,
+                              quality_cache=QualityCache())
+    trace = engine.refine_trace("initial plan", {'goal': 'test'})
+
+    assert len(trace) == 50
+    assert trace._solution is None
+    assert content_hash(trace) != content_hash(RefinementTrace("initial plan"))
+    assert engine.quality_cache.misses == 50
+
+
+def test_score_regression_is_not_reported_as_convergence():
+    engine = RefinementEngine(quality_threshold=0.9, convergence_epsilon=0.01)
+
+    assert engine._stop_reason([0.7, 0.6]) == 'regressed'
+    assert engine._stop_reason([0.7, 0.705]) == 'plateau'
+    assert engine._stop_reason([0.7, 0.7]) == 'plateau'
+    assert engine._stop_reason([0.7, 0.8]) is None
+    assert engine._stop_reason([0.7, 0.95]) == 'quality_threshold'